@@ -23,19 +23,30 @@ script1_conf = {    # 初始默认配置参数
     "image_source": None,
     'mode_separated': os.path.join(cache, "filter"),
     'quality_filtered': os.path.join(root, "filter"),
-    'CPU_workers': 1
+    'CPU_workers': 1,
+    'memory_budget_MB': 2048,   # 解码内存预算，同时解码的图像估算内存之和不超过该值
+    'encoder_profile': 'archival',  # 编码档位 fast / balanced / archival
+    'staging_hardlink': False,      # 缓存副本使用硬链接（只读暂存，不复制数据）
+    'virtual_staging': True         # 不按模式分类时使用虚拟暂存（文件清单），不复制到缓存目录
+}
+
+control_conf = {    # 限速（0 表示不限制），所有任务共享
+    'MB_per_sec': 0,        # 读写字节速率（MB/s）
+    'files_per_sec': 0      # 文件处理速率（个/s）
 }
 
 script2_conf = {    # 初始默认配置参数
     'src1': None,
     'src2': None,
-    'dst': os.path.join(root, "merge")
+    'dst': os.path.join(root, "merge"),
+    'skip_identical': True      # 增量合并：跳过内容相同的文件
 }
 
 script3_conf = {    # 初始默认配置参数
     'src': None,
     'dst': os.path.join(root, "extract"),
-    'target_dir': None
+    'target_dir': None,
+    'move': False       # 移动文件（删除源文件），同一设备内直接重命名
 }
 
 script4_conf = {    # 初始默认配置参数
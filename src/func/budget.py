@@ -0,0 +1,60 @@
+# x. 解码内存预算调度：根据文件头中的尺寸估算解码内存，按预算准入解码任务（线程、进程间共享）
+
+import multiprocessing
+from contextlib import contextmanager
+
+
+# 各图像模式每个像素占用的字节数（Pillow 的内部存储：多通道模式一律按 4 字节对齐，未列出的模式按 4 字节估算）
+MODE_BYTES = {
+    '1': 1, 'L': 1, 'P': 1,
+    'I;16': 2, 'I;16B': 2, 'I;16L': 2,
+    'LA': 4, 'La': 4, 'PA': 4,
+    'RGB': 4, 'YCbCr': 4, 'LAB': 4, 'HSV': 4,
+    'RGBA': 4, 'RGBa': 4, 'RGBX': 4, 'CMYK': 4, 'I': 4, 'F': 4,
+}
+
+
+def estimate_decode_bytes(width: int, height: int, mode: str, imgFormat: str)-> int:
+    """估算解码及格式转换所需的内存：解码后的像素缓冲 + 转换为 RGB 时的副本（同样每像素 4 字节）"""
+    pixels = width * height
+    need = pixels * MODE_BYTES.get(mode, 4)
+    if imgFormat == 'JPEG' and mode != 'RGB':
+        need += pixels * MODE_BYTES['RGB']
+    return need
+
+
+class DecodeBudget:
+    """
+    解码内存预算：已准入任务的估算内存之和不超过预算
+    超出预算的单个任务在没有其他任务解码时独占执行（只是串行化，该任务自身的峰值内存不变）
+    :param limit: 内存预算（B）
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.cond = multiprocessing.Condition()     # 使用多进程原语，可通过进程池 initializer 共享
+        self.used = multiprocessing.Value('q', 0, lock=False)
+        self.active = multiprocessing.Value('i', 0, lock=False)
+
+    def acquire(self, need: int):
+        """阻塞直到预算足够（或当前没有其他解码任务）"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.active.value == 0 or self.used.value + need <= self.limit)
+            self.used.value += need
+            self.active.value += 1
+
+    def release(self, need: int):
+        """归还预算并唤醒等待的任务"""
+        with self.cond:
+            self.used.value -= need
+            self.active.value -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def reserve(self, need: int):
+        """上下文管理器形式的准入，返回该任务是否超出预算"""
+        self.acquire(need)
+        try:
+            yield need > self.limit
+        finally:
+            self.release(need)
@@ -0,0 +1,118 @@
+# x. 任务控制：令牌桶限速（字节/秒、文件/秒）与协作式暂停/取消，file.py 与 filter.py 中的所有任务共享
+
+import time
+import multiprocessing
+
+
+class Cancelled(BaseException):
+    """
+    任务已被取消（继承 BaseException，不会被各处理函数中逐个文件的 except Exception 吞掉，
+    直接穿过工作池向上传递；工作池退出时等待执行中的任务完成）
+    """
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate 每秒补充令牌，最多累积 burst 个；允许透支，透支部分按速率折算为等待时间
+    :param rate: 每秒补充的令牌数，<= 0 表示不限速
+    :param burst: 令牌上限（允许的瞬时突发量），默认为 1 秒的令牌数
+    """
+
+    def __init__(self, rate: float = 0, burst: float|None = None):
+        self.lock = multiprocessing.Lock()      # 使用多进程原语，可通过进程池 initializer 共享
+        self.rate = multiprocessing.Value('d', 0, lock=False)
+        self.burst = multiprocessing.Value('d', 0, lock=False)
+        self.tokens = multiprocessing.Value('d', 0, lock=False)
+        self.stamp = multiprocessing.Value('d', time.monotonic(), lock=False)
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: float, burst: float|None = None):
+        """调整速率（任务执行中也可以调整），令牌桶重新装满"""
+        with self.lock:
+            self.rate.value = rate
+            self.burst.value = burst if burst is not None else rate
+            self.tokens.value = self.burst.value
+            self.stamp.value = time.monotonic()
+
+    def reserve(self, n: float)-> float:
+        """取出 n 个令牌，返回需要等待的秒数（令牌不足时透支，由调用方等待）"""
+        with self.lock:
+            rate = self.rate.value
+            if rate <= 0 or n <= 0:
+                return 0.0
+            now = time.monotonic()
+            tokens = min(self.burst.value, self.tokens.value + (now - self.stamp.value) * rate)
+            self.stamp.value = now
+            self.tokens.value = tokens - n
+            return -self.tokens.value / rate if self.tokens.value < 0 else 0.0
+
+
+class Control:
+    """
+    任务控制状态：字节与文件两个令牌桶，以及暂停、取消标记（线程、进程间共享）
+    """
+
+    def __init__(self):
+        self.bytes = TokenBucket()
+        self.files = TokenBucket()
+        self.running = multiprocessing.Event()      # 未暂停时置位
+        self.cancelled = multiprocessing.Event()
+        self.running.set()
+
+    def set_limits(self, bytes_per_sec: float = 0, files_per_sec: float = 0):
+        """设置限速，0 表示不限制"""
+        self.bytes.set_rate(bytes_per_sec)
+        self.files.set_rate(files_per_sec)
+
+    def reset(self):
+        """开始新任务前清除暂停、取消标记"""
+        self.cancelled.clear()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()  # 唤醒暂停中的任务，使其尽快退出
+
+    def is_paused(self)-> bool:
+        return not self.running.is_set()
+
+    def is_cancelled(self)-> bool:
+        return self.cancelled.is_set()
+
+    def checkpoint(self):
+        """检查点：暂停时阻塞直到继续，已取消时抛出 Cancelled"""
+        while not self.running.wait(0.2):
+            pass
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def throttle(self, nbytes: int = 0, files: int = 1):
+        """在处理一个文件（nbytes 字节）之前调用：检查暂停/取消，并按限速等待（等待期间可被取消打断）"""
+        self.checkpoint()
+        wait = max(self.files.reserve(files), self.bytes.reserve(nbytes))
+        if wait > 0 and self.cancelled.wait(wait):
+            raise Cancelled()
+        self.checkpoint()
+
+
+state = Control()       # 当前进程的任务控制状态
+
+
+def install(ctl: Control):
+    """使用指定的任务控制状态（作为进程池的 initializer，在工作进程中共享主进程的状态）"""
+    global state
+    state = ctl
+
+
+def checkpoint():
+    state.checkpoint()
+
+
+def throttle(nbytes: int = 0, files: int = 1):
+    state.throttle(nbytes, files)
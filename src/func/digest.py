@@ -0,0 +1,66 @@
+# x. 文件摘要计算，使用固定大小的缓冲区流式读取，支持选择摘要算法
+
+import hashlib
+
+try:    # 可选依赖：xxhash（非加密的高速哈希）
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+BUFFER_SIZE = 1024 * 1024   # 流式读取缓冲区大小（B），内存占用与文件大小无关
+DEFAULT_ALGO = "blake2b"    # 默认摘要算法（64 位平台上比 md5 更快）
+
+_hashlib_algos = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+    "blake2s": hashlib.blake2s,
+}
+
+_xxhash_algos = {
+    "xxh64": "xxh64",
+    "xxh3_64": "xxh3_64",
+    "xxh3_128": "xxh3_128",
+}
+
+
+def available_algos()-> list:
+    """列出当前环境可用的摘要算法"""
+    algos = list(_hashlib_algos)
+    if xxhash is not None:
+        algos.extend(_xxhash_algos)
+    return algos
+
+
+def new_hasher(algo: str = DEFAULT_ALGO):
+    """创建摘要对象（hashlib 兼容接口：update / hexdigest）"""
+    if algo in _hashlib_algos:
+        return _hashlib_algos[algo]()
+    if algo in _xxhash_algos:
+        if xxhash is None:
+            raise ValueError(f"摘要算法 {algo} 需要安装 xxhash")
+        return getattr(xxhash, _xxhash_algos[algo])()
+    raise ValueError(f"不支持的摘要算法: {algo}")
+
+
+def calculate_hash(file_path: str, algo: str = DEFAULT_ALGO, buffer_size: int = BUFFER_SIZE)-> str:
+    """流式计算文件内容哈希值，复用同一块缓冲区，内存占用固定"""
+    hasher = new_hasher(algo)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def calculate_bytes_hash(data: bytes, algo: str = DEFAULT_ALGO)-> str:
+    """计算内存数据的哈希值"""
+    hasher = new_hasher(algo)
+    hasher.update(data)
+    return hasher.hexdigest()
@@ -1,5 +1,9 @@
 # x. 工具类的共享资源（全局变量）
 
+from threading import Lock
+
+_lock = Lock()
+
 result = {
     "current_task": "",
     "total_jobs": 0,
@@ -31,6 +35,11 @@ def set_processed(processed: int):
 def get_processed():
     return result['processed']
 
+def add_processed(n: int = 1):
+    """增加已处理数量（多个线程同时更新进度时使用）"""
+    with _lock:
+        result['processed'] += n
+
 def set_current_job(job: str):
     result['current_job'] = job
 
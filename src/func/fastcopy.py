@@ -0,0 +1,117 @@
+# x. 文件复制后端：依次尝试 reflink 克隆、内核零拷贝（copy_file_range / sendfile）、硬链接（可选）、缓冲复制，返回每个文件实际使用的方式
+
+import os
+import sys
+import errno
+import shutil
+from threading import Lock
+
+try:    # 可选依赖：fcntl（仅 POSIX，用于 FICLONE）
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+REFLINK = "reflink"                 # 写时复制克隆（btrfs / XFS 等），不复制数据块
+COPY_FILE_RANGE = "copy_file_range" # 内核内复制，数据不经过用户空间
+SENDFILE = "sendfile"
+HARDLINK = "hardlink"               # 只读暂存：与源文件共享同一 inode
+BUFFERED = "buffered"               # 用户空间缓冲复制
+
+BUFFER_SIZE = 1024 * 1024   # 缓冲复制的缓冲区大小（B）
+FICLONE = 0x40049409        # ioctl(dst, FICLONE, src)
+
+# 表示该方式在当前文件系统组合上不可用的错误码（回退到下一种方式，并在同一设备组合上不再尝试）
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOSYS, errno.EBADF, errno.EPERM}
+
+_lock = Lock()
+_unsupported = set()    # {(方式, 源设备, 目标设备)}
+
+
+def _supported(method: str, devs: tuple)-> bool:
+    return (method, *devs) not in _unsupported
+
+
+def _mark_unsupported(method: str, devs: tuple):
+    with _lock:
+        _unsupported.add((method, *devs))
+
+
+def _reflink(fsrc, fdst)-> bool:
+    """FICLONE 克隆整个文件"""
+    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    return True
+
+
+def _copy_range(fsrc, fdst, size: int, method: str)-> bool:
+    """使用 copy_file_range / sendfile 在内核中复制，文件长度不符（例如特殊文件系统）时返回 False"""
+    copied = 0
+    while copied < size:
+        if method == COPY_FILE_RANGE:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied, copied, copied)
+        else:
+            n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+        if n == 0:
+            return False
+        copied += n
+    return True
+
+
+def _fast_paths():
+    """当前平台可用的快速复制方式（按优先顺序）"""
+    linux = sys.platform.startswith("linux")
+    paths = []
+    if fcntl is not None and linux:
+        paths.append(REFLINK)
+    if hasattr(os, "copy_file_range"):
+        paths.append(COPY_FILE_RANGE)
+    if hasattr(os, "sendfile") and linux:   # Linux 支持发送到普通文件
+        paths.append(SENDFILE)
+    return paths
+
+FAST_PATHS = _fast_paths()
+
+
+def _copy_data(fsrc, fdst, size: int, devs: tuple)-> str:
+    """复制文件内容，返回使用的方式"""
+    for method in FAST_PATHS:
+        if size == 0 or not _supported(method, devs):
+            continue
+        try:
+            if method == REFLINK:
+                done = _reflink(fsrc, fdst)
+            else:
+                done = _copy_range(fsrc, fdst, size, method)
+            if done:
+                return method
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            _mark_unsupported(method, devs)
+        # 回退前清除可能已写入的部分内容
+        fdst.seek(0)
+        fdst.truncate()
+        fsrc.seek(0)
+
+    shutil.copyfileobj(fsrc, fdst, BUFFER_SIZE)
+    return BUFFERED
+
+
+def copy_file(src: str, dst: str, hardlink: bool = False)-> str:
+    """
+    复制文件内容和元数据（同 shutil.copy2），返回使用的方式
+    :param hardlink: 只读暂存模式，优先创建硬链接（目标与源共享数据，修改任一方会影响另一方）
+    """
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return HARDLINK
+        except OSError:
+            pass
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        st = os.fstat(fsrc.fileno())
+        devs = (st.st_dev, os.fstat(fdst.fileno()).st_dev)
+        method = _copy_data(fsrc, fdst, st.st_size, devs)
+    shutil.copystat(src, dst)
+    return method
@@ -1,19 +1,51 @@
-# x. 文件工具，同构文件夹合并，文件提取，搜索目录并删除空的文件夹
+# x. 文件工具，同构文件夹合并，文件提取，搜索目录并删除空的文件夹（边生成操作计划边按块排序、分批执行）
 
 import os   
+import time
+import errno
 import shutil
+from contextlib import contextmanager
+from collections import Counter, deque
 
 import func.enum as enum
+import func.control as control
+import func.fastcopy as fastcopy
+from func.journal import Journal
+from func.pool import WorkerPool, IO, AUTO
+import func.walker as walker
+from func.nameindex import NameIndex
+from func.hashindex import HashIndex
+from func.digest import calculate_hash, DEFAULT_ALGO
+import func.plan as plan
+from func.plan import Op, Summary, make_op, locality_key, PLAN_CHUNK, MKDIR, COPY, MOVE, RENAME, DELETE, RMDIR
+
+
+PART_SUFFIX = ".part"   # 写出中的临时文件后缀
+
+
+@contextmanager
+def atomic_path(dst: str):
+    """
+    写出到目标文件旁的临时文件，成功后原子替换为目标文件；出错或任务取消时删除临时文件，
+    不会留下写了一半的目标文件
+    """
+    tmp = dst + PART_SUFFIX
+    try:
+        yield tmp
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
 
 def list_files(dir: str):
     """
-    列出指定目录下的所有文件 (BFS 广度优先遍历)
+    列出指定目录下的所有文件 (并行遍历，目录之间的顺序不确定)
     """
     try:
-        for root, dirs, files in os.walk(dir):
-            for file in files:
-                print(file.split(os.sep)[-1])
+        for depth, e in walker.iter_files(dir):
+            print(e.name)
     except Exception as e:
         raise e
 
@@ -38,39 +70,218 @@ def move_files(src: str, dst: str, target_dir: str|None):
             for item in os.listdir(src):
                 src_item = os.path.join(src, item)
                 dst_item = os.path.join(dst, item)
+                control.throttle(os.path.getsize(src_item) if os.path.isfile(src_item) else 0)
                 shutil.move(src_item, dst_item)
             # 可选：删除空的源目录
             if not os.listdir(src):
                 os.rmdir(src)
         else:
             # 移动单个文件
+            control.throttle(os.path.getsize(src))
             shutil.move(src, dst)
     except Exception as e:
         raise e
 
 
-def copy_1file(src: str, dst: str):
+def copy_1file(src: str, dst: str, hardlink: bool = False)-> str:
     """
-    复制单个文件 (跨文件系统)
+    复制单个文件 (跨文件系统)，受限速控制，先写入临时文件再替换为目标文件
+    返回实际使用的复制方式（reflink / copy_file_range / sendfile / hardlink / buffered，见 fastcopy）
+    :param hardlink: 只读暂存模式，优先创建硬链接
     """
     try:
+        control.throttle(0 if hardlink else os.path.getsize(src))
         # 创建目标文件的父级目录, 确保在移动单个文件时父级目录存在
         if not os.path.exists(dst):
             os.makedirs(os.path.dirname(dst), exist_ok=True)
-        shutil.copy2(src, dst)
+        with atomic_path(dst) as tmp:
+            return fastcopy.copy_file(src, tmp, hardlink)
     except Exception as e:
         raise e
 
 
-def copy_tree(src: str, dst: str, target_dir: str|None):
+PLAN_BATCH = 32     # 执行计划时每个任务最多包含的操作数
+
+
+def _run_op(op: Op)-> str:
+    """执行单条操作，返回实际使用的方式"""
+    kind = op.op
+    if kind == MKDIR:
+        os.makedirs(op.dst, exist_ok=True)
+    elif kind == COPY:
+        return copy_1file(op.src, op.dst, op.hardlink)
+    elif kind in (MOVE, RENAME):
+        return move_1file(op.src, op.dst, rename=kind == RENAME)
+    elif kind == DELETE:
+        control.throttle()
+        os.remove(op.src)
+    elif kind == RMDIR:
+        control.checkpoint()
+        os.rmdir(op.src)
+    else:
+        raise ValueError(f"未知的操作类型: {kind}")
+    return kind
+
+
+def _run_ops(batch: list)-> list:
+    """在工作线程中依次执行一批操作，返回每条操作的 (执行方式, 异常)"""
+    outcomes = []
+    for op in batch:
+        try:
+            outcomes.append((_run_op(op), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def _batches(ops: list, workers: int)-> list:
+    """按局部性排序后分批；操作较少时减小批量，保证每个工作线程都有任务"""
+    ops.sort(key=locality_key)
+    size = max(1, min(PLAN_BATCH, len(ops) // (workers * 4)))
+    return [ops[i:i + size] for i in range(0, len(ops), size)]
+
+
+def _chunked(ops, rmdirs: dict, workers: int):
+    """
+    按块读取操作流（生成器），返回待提交的批次：
+    创建目录在主线程中立即执行（目录总是先于其中的文件生成），文件操作每 PLAN_CHUNK 条排序分批一次，
+    删除目录的操作按深度收集到 rmdirs，留到文件操作全部完成后执行
+    """
+    chunk = []
+    for op in ops:
+        if op.op == MKDIR:
+            os.makedirs(op.dst, exist_ok=True)
+        elif op.op == RMDIR:
+            rmdirs.setdefault(op.depth, []).append(op)
+        else:
+            chunk.append(op)
+            if len(chunk) >= PLAN_CHUNK:
+                yield from _batches(chunk, workers)
+                chunk = []
+    if chunk:
+        yield from _batches(chunk, workers)
+
+
+def execute_plan(ops, job: str, journal: Journal|None = None, CPU_workers: int = AUTO)-> dict:
     """
-    复制目录下的所有文件 (跨文件系统)
+    流式执行操作计划：边生成边按块排序、分批提交到有界工作池（遍历与执行重叠，内存中最多保留一块文件操作），
+    相邻的操作（同一设备上 inode 相邻的文件、同一目录中的条目）由同一个工作线程连续执行；文件操作全部完成后由深到浅逐层删除目录
+    每完成一条文件操作或删除目录操作，已处理数量加 1（任务总数由生成操作的一方累加）
+    返回各执行方式的数量（删除目录时非空的目录计入 'kept'）；失败的操作计入 'failed' 并列在 'errors' 中
+    :param ops: 操作的可迭代对象（可以是生成器），见 func.plan
+    :param job: 任务名称（输出前缀）
+    :param journal: 任务日志，记录已完成的操作（带 key 的操作）
+    :param CPU_workers: 并行执行的工作数量，<= 0 表示按实测吞吐量自动调节
+    """
+    counts = Counter()
+    errors = []
+    rmdirs = {}     # 深度 -> [删除目录操作]
+
+    def collect(batch: list, future):
+        try:
+            outcomes = future.result()
+        except Exception as e:  # 整批失败（例如工作线程异常）
+            outcomes = [(None, e)] * len(batch)
+        for op, (method, error) in zip(batch, outcomes):
+            if error is None:
+                counts[method] += 1
+                if op.op in (COPY, MOVE, RENAME):
+                    print(f"[{job}] {op.op} ({method}) {op.src}\n          -> {op.dst}")
+                if journal is not None and op.key is not None:
+                    journal.record(op.key)
+            elif op.op == RMDIR and isinstance(error, OSError) and error.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                counts['kept'] += 1     # 非空目录保留，不视为错误
+            else:
+                counts['failed'] += 1
+                errors.append((op.src, op.dst, str(error)))
+                print(f"[{job}] {op.op} {op.src} 失败: {error}")
+            # 记录进度
+            enum.set_processed(enum.get_processed() + 1)
+            enum.set_current_job(os.path.basename(op.src))
+
+    with WorkerPool(CPU_workers, IO) as pool:
+        for batch, future in pool.run(_run_ops, _chunked(ops, rmdirs, pool.size)):
+            collect(batch, future)
+        # 同一层的目录互不包含，可以并行
+        for depth in sorted(rmdirs, reverse=True):
+            for batch, future in pool.run(_run_ops, _batches(rmdirs[depth], pool.size)):
+                collect(batch, future)
+    return {**counts, 'errors': errors}
+
+
+def estimate_plan(job: str, ops)-> dict:
+    """统计操作计划并按当前的限速设置估算执行耗时（dry-run，不执行任何操作）"""
+    summary = Summary(job)
+    for op in ops:
+        summary.add(op)
+    return summary.estimate(control.state.bytes.rate.value, control.state.files.rate.value)
+
+
+def _run_plan(job: str, ops, journal: Journal|None, CPU_workers: int, dry_run: bool, plan_path: str|None)-> dict:
+    """执行操作计划（可同时保存到 plan_path）；dry-run 时只统计并返回估算结果"""
+    if plan_path is not None:
+        ops = plan.save(plan_path, job, ops)
+    if dry_run:
+        result = estimate_plan(job, ops)
+        print(f"[{job}] dry-run: {result['files']} 个文件，{result['bytes'] / 1024 / 1024:.1f} MB，"
+              f"预计 {result['estimated_seconds']:.1f} 秒，操作 {result['ops']}")
+    else:
+        result = execute_plan(ops, job, journal, CPU_workers)
+    if plan_path is not None:
+        print(f"[{job}] 操作计划已保存: {plan_path}")
+    return result
+
+
+def _device(path: str)-> int:
+    """路径所在的设备号（路径尚不存在时取最近的已存在上级目录）"""
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return os.stat(path).st_dev
+
+
+def plan_copy_tree(src: str, dst: str, hardlink: bool = False):
+    """规划复制目录下的所有文件（生成器，并行遍历，不跟随指向目录的符号链接），任务总数在遍历过程中累加"""
+    for root, depth, entries in walker.walk(src):
+        dst_dir = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+        yield make_op(MKDIR, None, dst_dir, depth=depth)
+
+        dev = os.stat(root).st_dev
+        files = [e for e in entries if not e.is_dir()]
+        enum.set_total_jobs(enum.get_total_jobs() + len(files))
+        for e in files:
+            yield make_op(COPY, e.path, os.path.join(dst_dir, e.name), e.stat(follow_symlinks=False), dev, hardlink=hardlink)
+
+
+def copy_tree(src: str, dst: str, target_dir: str|None, hardlink: bool = False, CPU_workers: int = AUTO, dry_run: bool = False, plan_path: str|None = None)-> dict:
+    """
+    复制目录下的所有文件 (跨文件系统)，返回各复制方式的文件数量
+    边遍历边规划，按块排序（设备和 inode 顺序）后提交到有界复制池；全部完成后如有失败的文件，抛出 shutil.Error
+    :param hardlink: 只读暂存模式（例如过滤任务的缓存副本），优先创建硬链接
+    :param CPU_workers: 并行复制的工作数量，<= 0 表示按实测吞吐量自动调节
+    :param dry_run: 只规划并返回估算结果，不复制
+    :param plan_path: 保存操作计划的路径
     """
     try:
         # 根据提示是否创建并复制到子级目录下
         if target_dir is not None:
             dst = os.path.join(dst, target_dir)
-        shutil.copytree(src, dst, dirs_exist_ok=True)
+
+        # 进度跟踪参数（任务总数在遍历过程中累加）
+        enum.set_total_jobs(0)
+        enum.set_processed(0)
+
+        result = _run_plan("copy tree", plan_copy_tree(src, dst, hardlink), None, CPU_workers, dry_run, plan_path)
+        if dry_run:
+            return result
+
+        errors = result.pop('errors')
+        print(f"[copy tree] {src} -> {dst}: {result}")
+        if errors:
+            raise shutil.Error(errors)
+        return result
     except Exception as e:
         raise e
     
@@ -84,67 +295,151 @@ example_config = {
     "dst": "path\\to\\merge"
 }
 
-def merge_dirs(src1: str, src2: str, dst: str):
+MTIME_WINDOW_NS = 2 * 10**9  # 快速检查允许的修改时间误差（FAT/exFAT 等文件系统的时间精度较低）
+
+
+def _content_hash(path: str, st: os.stat_result, index: HashIndex|None)-> str:
+    """计算文件内容的哈希值（优先复用索引中未失效的记录）"""
+    if index is not None:
+        digest = index.lookup(path, st, DEFAULT_ALGO)
+        if digest is not None:
+            return digest
+    control.throttle(st.st_size)
+    digest = calculate_hash(path, DEFAULT_ALGO)
+    if index is not None:
+        index.store(path, st, DEFAULT_ALGO, digest)
+    return digest
+
+
+def _find_identical(src_file: str, candidates: list, index: HashIndex|None)-> str|None:
+    """
+    在候选文件中查找与源文件内容相同的文件，返回其路径（没有时为 None）
+    先进行快速检查（大小 + 修改时间，同 rsync），仍然一致的候选再比较哈希值
+    """
+    st = os.stat(src_file)
+    src_hash = None
+    for path in candidates:
+        try:
+            cst = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if cst.st_size != st.st_size or abs(cst.st_mtime_ns - st.st_mtime_ns) > MTIME_WINDOW_NS:
+            continue
+        if src_hash is None:
+            src_hash = _content_hash(src_file, st, index)
+        if _content_hash(path, cst, index) == src_hash:
+            return path
+    return None
+
+
+def plan_merge(src1: str, src2: str, dst: str, journal: Journal|None = None, CPU_workers: int = AUTO, skip_identical: bool = False, index: HashIndex|None = None, stats: Counter|None = None):
+    """
+    规划合并两个目录结构完全相同的文件夹（生成器），边遍历边生成操作，任务总数在遍历过程中累加
+    同名文件通过文件名索引按遍历顺序分配新文件名；跳过的相同文件数量累加到 stats['skipped']；其余参数见 merge_dirs
+    """
+    names = NameIndex()     # 目标目录文件名索引（包含已规划但尚未复制的文件）
+    dst_dirs = set()
+    new_dirs = deque()      # 已遍历、尚未输出的创建目录操作（先于目录中的文件输出）
+
+    def scan():
+        """遍历源目录，依次生成 (DirEntry, 目标目录, 设备号)"""
+        for src in [src1, src2]:
+            for root, depth, entries in walker.walk(src):
+                # 计算相对路径，创建目标目录
+                dst_dir = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+                if dst_dir not in dst_dirs:
+                    dst_dirs.add(dst_dir)
+                    new_dirs.append(make_op(MKDIR, None, dst_dir, depth=depth))
+                dev = os.stat(root).st_dev
+
+                # 同一目录内按文件名排序，重命名编号与遍历顺序无关
+                for e in sorted((e for e in entries if not e.is_dir()), key=lambda e: e.name):
+                    enum.set_total_jobs(enum.get_total_jobs() + 1)
+
+                    # 跳过之前已完成的文件（断点续传）
+                    if journal is not None and journal.is_done(e.path):
+                        enum.set_processed(enum.get_processed() + 1)
+                        continue
+                    yield e, dst_dir, dev
+
+    def compare(items):
+        """并行比较内容，过滤掉与已有版本相同的文件"""
+        planned = {}    # (目标目录, 文件名) -> 本次已规划的同名源文件（复制完成后与目标文件内容相同）
+        def with_candidates():
+            for e, dst_dir, dev in items:
+                key = (dst_dir, os.path.normcase(e.name))
+                candidates = names.variants(dst_dir, e.name) + planned.get(key, [])
+                planned.setdefault(key, []).append(e.path)
+                yield e, dst_dir, dev, candidates
+
+        # 按提交顺序返回比较结果，之后分配的重命名编号只取决于遍历顺序，与线程完成顺序无关
+        with WorkerPool(CPU_workers, IO) as cmp_pool:
+            for (e, dst_dir, dev, candidates), future in cmp_pool.run_ordered(lambda item: _find_identical(item[0].path, item[3], index), with_candidates()):
+                try:
+                    same = future.result()
+                except Exception as ex:
+                    print(f"[merge] 比较 {e.path} 失败: {ex}")
+                    same = None
+                if same is None:
+                    yield e, dst_dir, dev
+                    continue
+                print(f"[merge] skip {e.path} == {same}")
+                if stats is not None:
+                    stats['skipped'] += 1
+                enum.set_processed(enum.get_processed() + 1)
+                enum.set_current_job(e.name)
+
+    items = scan()
+    if skip_identical:
+        items = compare(items)
+
+    for e, dst_dir, dev in items:
+        while new_dirs:
+            yield new_dirs.popleft()
+
+        # 创建唯一文件名 dst_file
+        dst_file = names.claim(dst_dir, e.name)
+        if os.path.basename(dst_file) != e.name:
+            print(f"[merge] rename: {e.name} -> {os.path.basename(dst_file)}")
+        yield make_op(COPY, e.path, dst_file, e.stat(follow_symlinks=False), dev, key=e.path)
+    yield from new_dirs
+
+
+def merge_dirs(src1: str, src2: str, dst: str, journal: Journal|None = None, CPU_workers: int = AUTO, skip_identical: bool = False, index_path: str|None = None, dry_run: bool = False, plan_path: str|None = None):
     """
     合并两个目录结构完全相同的文件夹
+    一次遍历边规划边执行：复制操作按块排序（设备和 inode 顺序）后提交到有界复制池，任务总数在遍历过程中累加；
+    同名文件通过文件名索引分配新文件名，并发复制不会冲突
     :param src1: 第一个源文件夹目录
     :param src2: 第二个源文件夹目录
     :param dst: 合并到的目标文件夹目录
+    :param journal: 任务日志，跳过之前执行中已完成的文件，并记录新完成的文件
+    :param CPU_workers: 并行复制的工作数量，<= 0 表示按实测吞吐量自动调节
+    :param skip_identical: 增量合并，跳过与目标目录中同名文件（含重命名版本）或本次已合并的同名文件内容相同的文件
+    :param index_path: 增量合并时使用的哈希索引路径，重复合并时复用已计算的哈希值
+    :param dry_run: 只规划并返回估算结果，不复制
+    :param plan_path: 保存操作计划的路径
     """
+    index = HashIndex(index_path) if skip_identical and index_path is not None else None
     try:
-        # 统计文件数量
-        file_count = int(0)
-        for src in [src1, src2]:
-            for root, dirs, files in os.walk(src):
-                for f in files:
-                    if os.path.isfile(os.path.join(root, f)):
-                        file_count += 1
-
-        # 进度跟踪参数
+        # 进度跟踪参数（任务总数在遍历过程中累加）
         enum.clear_result()  # 清空结果
 
-        enum.set_total_jobs(file_count)
+        enum.set_total_jobs(0)
         enum.set_processed(0)
-        print(f"当前任务数量:{file_count}")
 
-        # 统一处理所有源目录
-        for src in [src1, src2]:
-            for root, dirs, files in os.walk(src):
-                # 计算相对路径
-                rel_path = os.path.relpath(root, src)
-                
-                # 创建目标目录
-                dst_dir = os.path.join(dst, rel_path)
-                os.makedirs(dst_dir, exist_ok=True)
-
-                for file in files:
-                    # 创建单个目标文件路径
-                    src_file = os.path.join(root, file)
-                    dst_file = os.path.join(dst_dir, file)
-
-                    # 创建唯一文件名 dst_file
-                    if os.path.exists(dst_file):
-                        base, ext = os.path.splitext(file)
-                        counter = 1
-                        while True:
-                            new_name = f"0A_{counter}_{file}{ext}"
-                            new_path = os.path.join(dst_dir, new_name)
-                            if not os.path.exists(new_path):    # 检查新的命名是否冲突
-                                print(f"[merge] rename: {file} -> {new_name}")
-                                dst_file = new_path
-                                break
-                            counter += 1
-                    
-                    # 复制文件（保留元数据）
-                    copy_1file(src_file, dst_file)
-                    print(f"[merge] copy {src_file}\n          -> {dst_file}")
-
-                    # 记录进度
-                    enum.set_processed(enum.get_processed() + 1)
-                    enum.set_current_job(file)
+        stats = Counter()
+        ops = plan_merge(src1, src2, dst, journal, CPU_workers, skip_identical, index, stats)
+        result = _run_plan("merge", ops, journal, CPU_workers, dry_run, plan_path)
+        if dry_run:
+            return result
+        print(f"[merge] 任务数量:{enum.get_total_jobs()}，跳过相同文件:{stats['skipped']}，失败:{result.get('failed', 0)}")
     except Exception as e:
         print(f"[merge] error: {e}")
         raise e
+    finally:
+        if index is not None:
+            index.close()
 
 
 ##
@@ -156,59 +451,90 @@ example_config = {
     "target_dir": "2025-03"
 }
 
-def extract_files(src: str, dst: str, target_dir: str|None):
+
+def move_1file(src: str, dst: str, rename: bool = True)-> str:
+    """
+    移动单个文件：同一设备直接 rename（仅修改目录项），跨设备时复制后删除源文件；返回使用的方式
+    :param rename: 是否先尝试 rename（源目录树中挂载了其他设备时，rename 失败会自动回退为复制）
+    """
+    if rename:
+        control.throttle()
+        try:
+            os.rename(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    method = copy_1file(src, dst)
+    os.remove(src)
+    return method
+
+
+def plan_extract(src: str, dst_path: str, journal: Journal|None = None, move: bool = False):
     """
-    提取目录下所有文件夹中的文件, 并移动到目录。根据 target_dir 是否为 None 来决定创建子级目录。
+    规划提取目录下所有文件夹中的文件到 dst_path（生成器），目标文件名按遍历顺序分配，任务总数在遍历过程中累加；参数见 extract_files
+    移动时按目录判断：与目标目录在同一设备上的目录中的文件 rename，其余文件复制后删除（设备号按目录 os.stat 获取一次）
+    """
+    yield make_op(MKDIR, None, dst_path)
+    dst_real = os.path.realpath(dst_path)
+    dst_dev = _device(dst_path)
+    names = NameIndex()     # 目标目录文件名索引
+
+    # 目标目录位于源目录树中时不遍历目标目录
+    for root, depth, entries in walker.walk(src, prune=lambda e: os.path.realpath(e.path) == dst_real):
+        if os.path.realpath(root) == dst_real:
+            continue
+
+        dev = os.stat(root).st_dev
+        if not move:    # 复制文件（保留元数据）
+            kind = COPY
+        else:
+            kind = RENAME if dev == dst_dev else MOVE
+
+        for e in sorted((e for e in entries if not e.is_dir()), key=lambda e: e.name):
+            enum.set_total_jobs(enum.get_total_jobs() + 1)
+
+            # 跳过之前已完成的文件（断点续传）
+            if journal is not None and journal.is_done(e.path):
+                enum.set_processed(enum.get_processed() + 1)
+                continue
+
+            # 创建唯一文件名 dst_file
+            dst_file = names.claim(dst_path, e.name)
+            if os.path.basename(dst_file) != e.name:
+                print(f"[extract] rename: {e.name} -> {os.path.basename(dst_file)}")
+            yield make_op(kind, e.path, dst_file, e.stat(follow_symlinks=False), dev, key=e.path)
+
+
+def extract_files(src: str, dst: str, target_dir: str|None, journal: Journal|None = None, move: bool = False, CPU_workers: int = AUTO, dry_run: bool = False, plan_path: str|None = None):
+    """
+    提取目录下所有文件夹中的文件到目录。根据 target_dir 是否为 None 来决定创建子级目录。
+    一次遍历边规划边执行，任务总数在遍历过程中累加；目标文件名在主线程中按遍历顺序分配，操作按块排序（设备和 inode 顺序）后分批执行
     :param src: 源文件夹目录
     :param dst: 目标文件夹目录
     :param target_dir: 创建的子级文件夹名称
+    :param journal: 任务日志，跳过之前执行中已完成的文件，并记录新完成的文件
+    :param move: 移动文件（删除源文件）：同一设备内直接 rename，跨设备时并行复制后删除；否则保留源文件
+    :param CPU_workers: 并行处理的工作数量，<= 0 表示按实测吞吐量自动调节
+    :param dry_run: 只规划并返回估算结果，不复制或移动
+    :param plan_path: 保存操作计划的路径
     """
     try:
-        # 统计文件数量
-        file_count = int(0)
-        for root, dirs, files in os.walk(src):
-            for f in files:
-                if os.path.isfile(os.path.join(root, f)):
-                    file_count += 1
-
-        # 进度跟踪参数
+        # 进度跟踪参数（任务总数在遍历过程中累加）
         enum.clear_result()  # 清空结果
 
-        enum.set_total_jobs(file_count)
+        enum.set_total_jobs(0)
         enum.set_processed(0)
-        print(f"当前任务数量:{file_count}")
-
-        for root, dirs, files in os.walk(src):
-            for file in files:
-                # 创建目标目录, 根据 target_dir 是否为 None 来决定创建子级目录
-                dst_path = dst
-                if target_dir is not None:
-                    dst_path = os.path.join(dst, target_dir)
-
-                # 创建单个目标文件路径
-                src_file = os.path.join(root, file)
-
-                # 创建唯一文件名 dst_path
-                if os.path.exists(os.path.join(dst_path, file)):
-                    counter = 1
-                    while True:
-                        new_name = f"0A_{counter}_{file}"
-                        new_path = os.path.join(dst_path, new_name)
-                        if not os.path.exists(new_path):    # 检查新的命名是否冲突
-                            print(f"[extract] rename: {file} -> {new_name}")
-                            dst_path = new_path
-                            break
-                        counter += 1
-                else:
-                    dst_path = os.path.join(dst_path, file)
-
-                # 复制文件（保留元数据）
-                copy_1file(src_file, dst_path)
-                print(f"[extract] move {src_file}\n             -> {dst_path}")
-
-                # 记录进度
-                enum.set_processed(enum.get_processed() + 1)
-                enum.set_current_job(file)
+
+        # 根据 target_dir 是否为 None 来决定创建子级目录
+        dst_path = dst
+        if target_dir is not None:
+            dst_path = os.path.join(dst, target_dir)
+
+        result = _run_plan("extract", plan_extract(src, dst_path, journal, move), journal, CPU_workers, dry_run, plan_path)
+        if dry_run:
+            return result
+        print(f"[extract] 任务数量:{enum.get_total_jobs()}，失败:{result.get('failed', 0)}")
     except Exception as e:
         print(f"[extract] error: {e}")
         raise e
@@ -222,48 +548,119 @@ example_config = {
     "only_empty": True
 }
 
-def delete_dirs(target: str, only_empty = True):
+
+def plan_delete(target: str, only_empty: bool = True, stats: Counter|None = None):
+    """
+    规划删除目录下的文件夹（生成器，保留目录本身及其中的文件），任务总数在遍历过程中累加；参数见 delete_dirs
+    完整删除时边遍历边生成删除文件的操作；删除目录的操作在遍历完成后生成（执行时由深到浅）
+    只删除空目录时，包含文件的目录及其所有上级目录都不会变为空，不生成操作，数量累加到 stats['kept']
+    """
+    dirs = {}       # 子目录 -> 深度
+    nonempty = []   # 包含文件的子目录
+    for path, depth, entries in walker.walk(target, stat=False):
+        if depth == 0:  # 根目录本身及其中的文件保留
+            continue
+        files = [e for e in entries if not e.is_dir(follow_symlinks=False)]
+        dirs[path] = depth
+        enum.set_total_jobs(enum.get_total_jobs() + 1)
+        if not only_empty:
+            enum.set_total_jobs(enum.get_total_jobs() + len(files))
+            for e in files:
+                yield make_op(DELETE, e.path, depth=depth)
+        elif files:
+            nonempty.append(path)
+
+    # 标记包含文件的目录及其上级目录
+    kept = set()
+    for path in nonempty:
+        while path in dirs and path not in kept:
+            kept.add(path)
+            path = os.path.dirname(path)
+    enum.set_processed(enum.get_processed() + len(kept))
+    if stats is not None:
+        stats['kept'] += len(kept)
+
+    for path, depth in dirs.items():
+        if path not in kept:
+            yield make_op(RMDIR, path, depth=depth)
+
+
+def delete_dirs(target: str, only_empty = True, CPU_workers: int = AUTO, dry_run: bool = False, plan_path: str|None = None)-> dict:
     """
-    删除目录下文件夹
+    删除目录下文件夹（保留目录本身及其中的文件），一次并行 scandir 遍历
     :param target: 目录路径
-    :param only_empty: 是否只删除目录下的空文件夹
+    :param only_empty: 是否只删除目录下的空文件夹（删除子目录后变为空的目录也会被删除）
+    :param CPU_workers: 并行删除的工作数量，<= 0 表示按实测吞吐量自动调节
+    :param dry_run: 只规划并返回估算结果，不删除
+    :param plan_path: 保存操作计划的路径
+    完整删除时边遍历边按微批并行删除文件；之后由深到浅逐层并行删除目录
     """
-    try:    
-        # 统计文件夹数量
-        file_count = int(0)
-        for root, dirs, files in os.walk(target):
-            for d in dirs:
-                if os.path.isdir(os.path.join(root, d)):
-                    file_count += 1
-
-        # 进度跟踪参数
+    try:
+        start_time = time.time()
+
+        # 进度跟踪参数（任务总数在遍历过程中累加）
         enum.clear_result()  # 清空结果
 
-        enum.set_total_jobs(file_count)
+        enum.set_total_jobs(0)
         enum.set_processed(0)
-        print(f"当前任务数量:{file_count}")
-
-        for root, dirs, files in os.walk(target, topdown=False):
-            for dir in dirs:
-                dir_path = os.path.join(root, dir)
-                if only_empty:
-                    if len(os.listdir(dir_path)) == 0:
-                        os.rmdir(dir_path)
-                        print(f"[delete] empty: {dir_path}")
-                    else:
-                        print(f"[delete] skip: {dir_path}")
-                else:
-                    # 递归删除目录及其内容
-                    try:
-                        shutil.rmtree(dir_path)
-                        print(f"[delete] all: {dir_path}")
-                    except Exception as e:
-                        print(f"删除目录时出错: {e}")
-
-                # 记录进度
-                enum.set_processed(enum.get_processed() + 1)
-                enum.set_current_job(dir)
+
+        stats = Counter()
+        result = _run_plan("delete", plan_delete(target, only_empty, stats), None, CPU_workers, dry_run, plan_path)
+        if dry_run:
+            return result
+
+        counts = {'files': result.get(DELETE, 0), 'removed': result.get(RMDIR, 0), 'kept': stats['kept'] + result.get('kept', 0)}
+        if result.get('failed'):
+            counts['failed'] = result['failed']
+
+        end_time = time.time()
+        print(f"[delete] {target}: {counts}")
+        return {'cost_time': end_time - start_time, **counts}
     except Exception as e:
         print(f"[delete] error: {e}")
         raise e
 
+
+if __name__ == "__main__":
+    # 操作计划命令: python -m func.file {copy|merge|extract|delete} ... [--dry-run] [--save 计划路径]
+    #               python -m func.file run <计划路径>
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m func.file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmds = {
+        "copy": sub.add_parser("copy", help="复制目录下的所有文件"),
+        "merge": sub.add_parser("merge", help="合并两个同构目录"),
+        "extract": sub.add_parser("extract", help="提取所有子目录中的文件"),
+        "delete": sub.add_parser("delete", help="删除目录下的文件夹"),
+    }
+    cmds["copy"].add_argument("src")
+    cmds["copy"].add_argument("dst")
+    cmds["merge"].add_argument("src1")
+    cmds["merge"].add_argument("src2")
+    cmds["merge"].add_argument("dst")
+    cmds["merge"].add_argument("--skip-identical", action="store_true")
+    cmds["extract"].add_argument("src")
+    cmds["extract"].add_argument("dst")
+    cmds["extract"].add_argument("--move", action="store_true")
+    cmds["delete"].add_argument("target")
+    cmds["delete"].add_argument("--all", action="store_true", help="同时删除子目录中的文件")
+    for cmd in cmds.values():
+        cmd.add_argument("--dry-run", action="store_true", help="只规划并估算耗时")
+        cmd.add_argument("--save", default=None, help="保存操作计划的路径")
+    run = sub.add_parser("run", help="执行保存的操作计划")
+    run.add_argument("plan")
+    args = parser.parse_args()
+
+    if args.command == "copy":
+        copy_tree(args.src, args.dst, None, dry_run=args.dry_run, plan_path=args.save)
+    elif args.command == "merge":
+        merge_dirs(args.src1, args.src2, args.dst, skip_identical=args.skip_identical, dry_run=args.dry_run, plan_path=args.save)
+    elif args.command == "extract":
+        extract_files(args.src, args.dst, None, move=args.move, dry_run=args.dry_run, plan_path=args.save)
+    elif args.command == "delete":
+        delete_dirs(args.target, not args.all, dry_run=args.dry_run, plan_path=args.save)
+    elif args.command == "run":
+        job, ops = plan.load(args.plan)
+        result = execute_plan(ops, job)
+        print(f"[plan] {args.plan}: {result}")
@@ -1,12 +1,21 @@
 # x. 图片分类（过滤），按模式分离，按质量分离，通过文件哈希查找删除重复图片
 
 import os
+import io
 from PIL import Image
-import concurrent.futures
 import time
 import shutil
+from contextlib import contextmanager
+from functools import partial
 
 import func.enum as enum
+import func.control as control
+import func.fastcopy as fastcopy
+from func.file import atomic_path
+from func.budget import DecodeBudget, estimate_decode_bytes
+from func.pool import WorkerPool, IO, CPU
+import func.walker as walker
+from func.journal import Journal
 
 
 ##
@@ -21,24 +30,121 @@ example_config = {
 # 提高像素限制（按需调整数值）
 Image.MAX_IMAGE_PIXELS = 200000000
 
-def process_format(imgPath: str, outDir: str, filename: str):
-    """根据输入图像的透明通道进行格式转换 (JPEG/PNG)，并且尽可能保证图像的最大质量"""
+IO_BATCH = 16       # I/O 密集的小任务（移动、采样哈希）每个任务包含的文件数
+
+decode_budget: DecodeBudget|None = None   # 当前任务的解码内存预算（None 表示不限制）
+
+def set_decode_budget(budget: DecodeBudget|None):
+    """设置解码内存预算（也作为进程池的 initializer，在工作进程中共享同一预算）"""
+    global decode_budget
+    decode_budget = budget
+
+
+def _init_worker(budget: DecodeBudget|None, ctl: control.Control):
+    """进程池 initializer：在工作进程中共享主进程的解码内存预算和任务控制状态"""
+    set_decode_budget(budget)
+    control.install(ctl)
+
+def target_format(img: Image.Image)-> tuple:
+    """根据图像的透明通道决定输出格式，返回 (格式, 后缀)：有透明通道时为 PNG，否则为 JPEG"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        return 'PNG', '.png'
+    return 'JPEG', '.jpg'
+
+
+def needs_convert(img: Image.Image, imgFormat: str)-> bool:
+    """
+    仅根据文件头信息（格式、模式）判断是否需要重新编码：
+    已经是 RGB 模式的 JPEG，或目标格式为 PNG 的 PNG 图像，可以直接复用原始字节
+    """
+    if img.format != imgFormat:
+        return True
+    if imgFormat == 'JPEG':
+        return img.mode != 'RGB'
+    return False
+
+
+def link_or_copy(src: str, dst: str, hardlink: bool = False):
+    """
+    直接复用原始字节：复制文件（优先 reflink / 内核零拷贝，见 fastcopy）
+    :param hardlink: 只读暂存模式，优先创建硬链接（输出与源文件共享数据，修改任一方会影响另一方）
+    """
+    if os.path.exists(dst):
+        os.remove(dst)
+    with atomic_path(dst) as tmp:
+        fastcopy.copy_file(src, tmp, hardlink)
+
+
+# 编码档位：fast 追求速度，balanced 兼顾速度与体积，archival 追求最大质量与最小体积（原有参数）
+ENCODER_PROFILES = {
+    'fast': {
+        'JPEG': {'quality': 90, 'subsampling': 2, 'progressive': False},
+        'PNG': {'compress_level': 1, 'optimize': False}
+    },
+    'balanced': {
+        'JPEG': {'quality': 95, 'subsampling': 2, 'progressive': True},
+        'PNG': {'compress_level': 6, 'optimize': False}
+    },
+    'archival': {
+        'JPEG': {'quality': 95, 'subsampling': 2, 'progressive': True},
+        'PNG': {'compress_level': 9, 'optimize': True}
+    }
+}
+DEFAULT_PROFILE = 'archival'
+
+
+def get_save_args(img: Image.Image, imgFormat: str, profile: str = DEFAULT_PROFILE)-> dict:
+    """按编码档位准备保存参数"""
+    save_args = dict(ENCODER_PROFILES[profile][imgFormat])
+    if imgFormat == 'JPEG':
+        # 保留支持的元数据
+        allowed_params = {'dpi', 'icc_profile'}
+        save_args.update({k: v for k, v in img.info.items() if k in allowed_params})
+    else:
+        save_args['bits'] = img.bits if hasattr(img, 'bits') else 8  # 保留色深
+        # 保留支持的元数据
+        allowed_meta = {'dpi', 'icc_profile', 'compress_level'}
+        save_args.update({k: v for k, v in img.info.items() if k in allowed_meta})
+    return save_args
+
+
+def encode_image(img: Image.Image, fp, imgFormat: str, profile: str = DEFAULT_PROFILE):
+    """
+    将已加载的图像编码为目标格式，写入路径或文件对象
+    :param profile: 编码档位，见 ENCODER_PROFILES
+    """
+    if imgFormat == 'JPEG' and img.mode != 'RGB':
+        img = img.convert('RGB')    # 一律转换为 RGB 模式
+    img.save(fp, format=imgFormat, **get_save_args(img, imgFormat, profile))
+
+
+@contextmanager
+def reserve_decode(img: Image.Image, imgFormat: str):
+    """
+    按文件头中的尺寸估算解码内存并向预算申请准入，返回是否超出预算
+    超出预算的图像只会独占执行（不与其他解码任务同时进行），其自身的峰值内存不会降低
+    """
+    if decode_budget is None:
+        yield False
+        return
+    with decode_budget.reserve(estimate_decode_bytes(img.width, img.height, img.mode, imgFormat)) as over:
+        yield over
+
+
+def process_format(imgPath: str, outDir: str, filename: str, passthrough: bool = True, profile: str = DEFAULT_PROFILE, hardlink: bool = False)-> str|None:
+    """
+    根据输入图像的透明通道进行格式转换 (JPEG/PNG)，并且尽可能保证图像的最大质量，返回输出格式（失败时为 None）
+    :param passthrough: 无需转换的图像直接复制原始文件，不进行解码/编码（避免代际损失）
+    :param profile: 编码档位，见 ENCODER_PROFILES
+    :param hardlink: 直接复用的原始文件优先创建硬链接（只读暂存）
+    """
     try:
+        control.throttle(os.path.getsize(imgPath))  # 限速，暂停/取消检查点
         with Image.open(imgPath) as img:
-            img.load()  # 延迟加载图像，确保每个线程都拥有完整的图像数据副本
-
-            imgFormat = "1"
-            imgSuffix = ".1"
-            filename = os.path.splitext(filename)[0]   #  清除原图像可能不正确的后缀
-
             # 检查图像是否有透明通道，或者是否采用无损格式（PNG），然后进行格式转换
-            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                imgFormat = 'PNG'           # 转换为 PNG 格式
-                imgSuffix = '.png'
-            else:
-                img = img.convert('RGB')    # 一律转换为 RGB 模式
-                imgFormat = 'JPEG'          # 转换为 JPEG 格式
-                imgSuffix = '.jpg'
+            imgFormat, imgSuffix = target_format(img)   # Image.open 只读取文件头
+            filename = os.path.splitext(filename)[0]   #  清除原图像可能不正确的后缀
+            convert = not passthrough or needs_convert(img, imgFormat)
 
             # 根据格式创建输出目录
             outDir = os.path.join(outDir, imgFormat)
@@ -48,234 +154,585 @@ def process_format(imgPath: str, outDir: str, filename: str):
             outPath = os.path.join(outDir, filename)
             outPath = f"{outPath}{imgSuffix}"
 
-            # 准备保存参数
-            save_args = {}
-            if imgFormat == 'JPEG':
-                # JPEG 优化参数
-                save_args.update({
-                    'quality': 95,                # 平衡质量与体积
-                    'subsampling': 2,             # 启用子采样（4:2:0）
-                    'progressive': True           # 启用渐进式编码
-                })
-                # 保留支持的元数据
-                allowed_params = {'dpi', 'icc_profile'}
-                save_args.update({k: v for k, v in img.info.items() if k in allowed_params})
+            if convert:
+                with reserve_decode(img, imgFormat):    # 按内存预算准入解码
+                    img.load()  # 延迟加载图像，确保每个线程都拥有完整的图像数据副本
+                    with atomic_path(outPath) as tmp:
+                        encode_image(img, tmp, imgFormat, profile)
             else:
-                # PNG 优化参数
-                save_args.update({
-                    'compress_level': 9,       # 最高压缩级别
-                    'optimize': True,          # 启用过滤优化
-                    'bits': img.bits if hasattr(img, 'bits') else 8  # 保留色深
-                })
-                # 保留支持的元数据
-                allowed_meta = {'dpi', 'icc_profile', 'compress_level'}
-                save_args.update({k: v for k, v in img.info.items() if k in allowed_meta})
-            img.save(outPath, format=imgFormat, **save_args)
+                link_or_copy(imgPath, outPath, hardlink)
             
             # print(f"[Format] Converted {imgPath} -> {outPath}")
+            return imgFormat
     except Exception as e:
         print(f"[Format] Error Converting {filename}: {str(e)}")
+        return None
 
 
-def separate_mode(input_dir: str, output_dir: str, CPU_workers: int = 1)-> dict:
-    """多线程图片按格式分离主函数"""
+def process_format_file(imgPath: str, outDir: str, passthrough: bool = True, profile: str = DEFAULT_PROFILE, hardlink: bool = False)-> str|None:
+    """以路径调用 process_format（可被进程池序列化），返回精简的结果记录：输出格式"""
+    return process_format(imgPath, outDir, os.path.basename(imgPath), passthrough, profile, hardlink)
+
+
+def _skip_done(paths, journal: Journal, prefix: str):
+    """过滤日志中已完成的路径，已完成的直接计入进度"""
+    for path in paths:
+        if journal.is_done(prefix + path):
+            enum.set_processed(enum.get_processed() + 1)
+        else:
+            yield path
+
+
+def iter_files(input_dir: str):
+    """
+    使用 scandir 流式遍历目录下的文件（DirEntry），无需预先构建文件列表
+    先只按文件名计数一次（目录项自带类型，不需要 stat）得到准确的任务总数，再次遍历时边遍历边返回
+    """
+    with os.scandir(input_dir) as it:
+        count = sum(1 for e in it if e.is_file())
+    enum.set_total_jobs(enum.get_total_jobs() + count)
+
+    with os.scandir(input_dir) as it:
+        for e in it:
+            if e.is_file():
+                if count > 0:
+                    count -= 1
+                else:   # 计数后新增的文件
+                    enum.set_total_jobs(enum.get_total_jobs() + 1)
+                yield e
+
+
+def separate_mode(input_dir: str, output_dir: str, CPU_workers: int = 1, use_process: bool = False, chunk_size: int = 0, passthrough: bool = True, memory_budget_MB: int = 0, profile: str = DEFAULT_PROFILE, journal: Journal|None = None, hardlink: bool = False)-> dict:
+    """
+    多线程图片按格式分离主函数
+    :param use_process: 是否使用进程池（解码/编码受 GIL 限制，多核时进程池吞吐更高）
+    :param chunk_size: 每个任务的文件数（微批），0 表示自动（进程池 16，线程池 1）
+    :param passthrough: 无需转换的图像直接复用原始字节
+    :param memory_budget_MB: 解码内存预算（MB），同时解码的图像估算内存之和不超过预算，0 表示不限制
+    :param profile: 编码档位 fast / balanced / archival，见 ENCODER_PROFILES
+    :param journal: 任务日志，跳过之前执行中已转换的文件
+    :param hardlink: 直接复用的原始文件优先创建硬链接（只读暂存，默认复制，输出与源文件互不影响）
+    """
     try:
         start_time = time.time()
         print(f"\n[separate mode] 开始分离图片（按格式）: {input_dir}")
         
-        # 获取所有文件，保存为列表
-        file_list = []
-        for f in os.listdir(input_dir):
-            if os.path.isfile(os.path.join(input_dir, f)):
-                file_list.append(f)
-        
-        # 进度跟踪参数
+        # 进度跟踪参数（任务总数在遍历过程中累加）
         enum.clear_result()  # 清空结果
 
         enum.set_current_task("separate mode")
-        enum.set_total_jobs(len(file_list))
+        enum.set_total_jobs(0)
         enum.set_processed(0)
 
-        # 创建线程池（根据 CPU 核心数自动调整）
-        with concurrent.futures.ThreadPoolExecutor(max_workers=CPU_workers) as executor:
-            # 提交所有处理任务 (将列表推导式改为常规的循环)
-            futures = []
-            for f in file_list:
-                imgPath = os.path.join(input_dir, f)
-                future = executor.submit(process_format, imgPath, output_dir, f)
-                futures.append(future)
-            
+        # 解码内存预算（线程池和进程池中的工作进程共享同一预算）
+        if memory_budget_MB > 0:
+            set_decode_budget(DecodeBudget(memory_budget_MB * 1024 * 1024))
+
+        # 进程池模式下常驻工作进程按块领取路径，减少进程间通信开销
+        if chunk_size <= 0:
+            chunk_size = 16 if use_process else 1
+
+        # 创建工作池（CPU 密集，工作数量 <= 0 时自动调节），边遍历边提交
+        paths = (e.path for e in iter_files(input_dir))
+        if journal is not None:     # 跳过之前已完成的文件（断点续传）
+            paths = _skip_done(paths, journal, "mode:")
+        task = partial(process_format_file, outDir=output_dir, passthrough=passthrough, profile=profile, hardlink=hardlink)
+        with WorkerPool(CPU_workers, CPU, use_process, initializer=_init_worker, initargs=(decode_budget, control.state)) as pool:
             # 显示进度
-            for future in concurrent.futures.as_completed(futures):
+            for path, future in pool.run(task, paths, chunk_size):
                 try:
-                    future.result()
+                    if future.result() is not None and journal is not None:
+                        journal.record("mode:" + path)
                 except Exception as e:
                     print(f"[separate mode] 处理异常: {str(e)}")
                 finally:    # 记录进度
                     enum.set_processed(enum.get_processed() + 1)
-                    enum.set_current_job(file_list[enum.get_processed() - 1])
+                    enum.set_current_job(os.path.basename(path))
             
         end_time = time.time()
         return {'cost_time': end_time - start_time}
     except Exception as e:
         print(f"\n[separate mode] 任务异常: {str(e)}")
         return {'error': str(e)}
-
+    finally:
+        set_decode_budget(None)
+
+
+
+def calibrate_profiles(input_dir: str, sample: int = 20, profiles: list|None = None)-> dict:
+    """
+    编码档位校准：从目录中均匀抽取样本图像，解码一次后分别用各档位编码到内存，
+    统计每个档位的耗时、吞吐量和输出体积，返回 {档位: 统计结果}
+    :param sample: 样本数量
+    """
+    profiles = profiles or list(ENCODER_PROFILES)
+    names = sorted(e.name for e in os.scandir(input_dir) if e.is_file())
+    step = max(1, len(names) // sample)
+    names = names[::step][:sample]
+
+    report = {p: {'images': 0, 'input_bytes': 0, 'output_bytes': 0, 'seconds': 0.0} for p in profiles}
+    for name in names:
+        path = os.path.join(input_dir, name)
+        try:
+            with Image.open(path) as img:
+                img.load()
+                imgFormat, _ = target_format(img)
+                if imgFormat == 'JPEG' and img.mode != 'RGB':
+                    img = img.convert('RGB')    # 颜色转换与档位无关，不计入编码耗时
+                for p in profiles:
+                    buffer = io.BytesIO()
+                    start_time = time.perf_counter()
+                    encode_image(img, buffer, imgFormat, profile=p)
+                    stats = report[p]
+                    stats['seconds'] += time.perf_counter() - start_time
+                    stats['images'] += 1
+                    stats['input_bytes'] += os.path.getsize(path)
+                    stats['output_bytes'] += buffer.tell()
+        except Exception as e:
+            print(f"[calibrate] 跳过 {name}: {str(e)}")
+
+    for p, stats in report.items():
+        seconds = stats['seconds'] or 1e-9
+        stats['images_per_sec'] = stats['images'] / seconds
+        stats['MB_per_sec'] = stats['input_bytes'] / 1024 / 1024 / seconds
+        stats['size_ratio'] = stats['output_bytes'] / stats['input_bytes'] if stats['input_bytes'] else 0.0
+        print(f"[calibrate] {p:<9} {stats['images']} 张  {stats['images_per_sec']:8.2f} 张/s  "
+              f"{stats['MB_per_sec']:8.2f} MB/s  输出/输入 {stats['size_ratio']:.3f}")
+    return report
 
 
 # =========================================================================
 
 
-def process_separate_quality(filename: str, input_dir:str, output_dir:str, quality_boundary:int):
-    """处理单个图片质量的线程函数"""
-    try:
-        img_path = os.path.join(input_dir, filename)
+def quality_bucket(file_size: int, quality_boundary: int)-> str:
+    """根据文件体积（KB）划分质量目录"""
+    return "QUALITY" if int(file_size / 1024) >= quality_boundary else "LOW"
+
 
-        # 获取图像体积
-        file_size = os.path.getsize(img_path)
-        size_in_KB = int(file_size/1024)
+def same_device(src_dir: str, dst_dir: str)-> bool:
+    """判断两个目录是否位于同一设备（同一设备内可以直接 rename）"""
+    return os.stat(src_dir).st_dev == os.stat(dst_dir).st_dev
 
-        # 根据质量创建输出目录
-        output_subdir = "QUALITY" if size_in_KB >= quality_boundary else "LOW"
-        output_path = os.path.join(output_dir, output_subdir)
-        os.makedirs(output_path, exist_ok=True)
 
+def move_file(src: str, dst: str, rename: bool):
+    """移动单个文件：同一设备直接 rename（仅修改目录项），跨设备时复制后删除源文件"""
+    if rename:
+        control.throttle()
+        os.replace(src, dst)
+    else:
+        control.throttle(os.path.getsize(src))
+        with atomic_path(dst) as tmp:
+            fastcopy.copy_file(src, tmp)
+        os.remove(src)
+
+
+def process_separate_quality(item: tuple, rename: bool):
+    """处理单个图片质量的线程函数，item 为 (文件名, 源路径, 目标路径)"""
+    filename, src, dst = item
+    try:
         # 移动图像到对应目录
-        shutil.move(img_path, os.path.join(output_path, filename))
+        move_file(src, dst, rename)
 
-        # print(f"[separate quality] 完成 {filename} 已移动到 {output_subdir}/")
+        # print(f"[separate quality] 完成 {filename} 已移动到 {dst}")
     except Exception as e:
         print(f"[separate quality] 处理 {filename} 时出错: {str(e)}")
 
 
 def separate_quality(input_dir: str, output_dir: str, CPU_workers: int = 1, quality_boundary: int = 500)-> dict:
-    """多线程图片按质量分离主函数"""
+    """
+    多线程图片按质量分离主函数
+    一次 scandir 遍历获取文件体积（复用 DirEntry 的 stat 结果），同一设备内批量 rename，跨设备时复制后删除
+    """
     try:
         start_time = time.time()
         print(f"\n[separate mode] 开始分离图片（按质量）: {input_dir}")
 
-        # 获取所有文件，保存为列表
-        file_list = []
-        for f in os.listdir(input_dir):
-            if os.path.isfile(os.path.join(input_dir, f)):
-                file_list.append(f)
-
-        # 进度跟踪参数
+        # 进度跟踪参数（任务总数在遍历过程中累加）
         enum.clear_result()  # 清空结果
 
         enum.set_current_task("separate quality")
-        enum.set_total_jobs(len(file_list))
+        enum.set_total_jobs(0)
         enum.set_processed(0)
 
-        # 创建线程池（根据 CPU 核心数自动调整）
-        with concurrent.futures.ThreadPoolExecutor(max_workers=CPU_workers) as executor:
-            # 提交所有处理任务 (将列表推导式改为常规的循环)
-            futures = []
-            for f in file_list:
-                future = executor.submit(process_separate_quality, f, input_dir, output_dir, quality_boundary)
-                futures.append(future)
+        # 输入目录不存在（例如按模式分类后没有该格式的图片）时没有需要处理的文件，不创建输出目录
+        if not os.path.isdir(input_dir):
+            print(f"[separate quality] 目录不存在，跳过: {input_dir}")
+            return {'cost_time': time.time() - start_time, 'renamed': False}
 
+        # 预先创建质量目录，并判断是否可以直接 rename
+        for bucket in ("QUALITY", "LOW"):
+            os.makedirs(os.path.join(output_dir, bucket), exist_ok=True)
+        rename = same_device(input_dir, output_dir)
+
+        # 根据 scandir 的 stat 结果确定目标路径
+        items = (
+            (e.name, e.path, os.path.join(output_dir, quality_bucket(e.stat().st_size, quality_boundary), e.name))
+            for e in iter_files(input_dir)
+        )
+
+        # 创建线程池（I/O 密集，工作数量 <= 0 时自动调节），边遍历边按微批提交
+        with WorkerPool(CPU_workers, IO) as pool:
             # 显示进度（可选）
-            for future in concurrent.futures.as_completed(futures):
+            for item, future in pool.run(lambda item: process_separate_quality(item, rename), items, IO_BATCH):
                 try:
                     future.result()
                 except Exception as e:
                     print(f"[separate quality] 处理异常: {str(e)}")
                 finally:    # 记录进度
                     enum.set_processed(enum.get_processed() + 1)
-                    enum.set_current_job(file_list[enum.get_processed() - 1])
+                    enum.set_current_job(item[0])
 
         end_time = time.time()
-        return {'cost_time': end_time - start_time}
+        return {'cost_time': end_time - start_time, 'renamed': rename}
     except Exception as e:
         print(f"\n[separate quality] 任务异常: {str(e)}")
+        return {'error': str(e)}
 
 
 # ================================================================
 
 
-from hashlib import md5
+from func.digest import calculate_hash, calculate_bytes_hash, DEFAULT_ALGO
 
-def calculate_hash(file_path):
-    """计算文件内容哈希值"""
-    with open(file_path, "rb") as f:
-        return md5(f.read()).hexdigest()
-    
 
-from threading import Lock
-
-hash_lock = Lock()
-known_hashes = set()  # 使用集合提升查询效率
-
-def process_clear_duplicate(filename, input_dir):
-    """处理单个图片查重的线程函数"""
-    try:
-        # 计算文件哈希值
-        file_path = os.path.join(input_dir, filename)
-        file_hash = calculate_hash(file_path)
-
-        # 使用锁保护对共享资源的访问
-        with hash_lock:
-            # 检查哈希值是否已存在
-            if file_hash in known_hashes:
-                os.remove(file_path)
-                print(f"[clear duplicate] {filename}")
-            else:
-                known_hashes.add(file_hash)
-    except Exception as e:
-        print(f"[clear duplicate] 处理 {filename} 失败: {str(e)}")
+PARTIAL_SIZE = 64 * 1024    # 部分哈希的头/尾采样大小（B）
 
+def calculate_partial_hash(file_path, file_size: int, algo: str = DEFAULT_ALGO):
+    """计算文件头部和尾部采样的哈希值；文件不大于两倍采样时等同于全文哈希"""
+    control.throttle(min(file_size, 2 * PARTIAL_SIZE))
+    with open(file_path, "rb") as f:
+        data = f.read(PARTIAL_SIZE)
+        if file_size > 2 * PARTIAL_SIZE:
+            f.seek(-PARTIAL_SIZE, os.SEEK_END)
+        data += f.read(PARTIAL_SIZE)
+    return calculate_bytes_hash(data, algo)
+    
 
-def clear_duplicate(input_dir: str, CPU_workers: int = 1)-> dict:
-    """多线程图片查重主函数，使用文件哈希值校验"""
+from func.hashindex import HashIndex
+
+
+def scan_files(input_dir: str, recursive: bool = False)-> list:
+    """
+    一次遍历获取文件列表 [(相对路径, 绝对路径, stat), ...]（并行遍历，stat 在遍历线程中完成）
+    递归时跳过以 . 开头的隐藏目录（例如缓存目录中的哈希索引）
+    """
+    input_dir = os.path.abspath(input_dir)
+    prune = walker.skip_hidden if recursive else (lambda e: True)
+    entries = []
+    for root, depth, dir_entries in walker.walk(input_dir, prune=prune):
+        for e in dir_entries:
+            if e.is_file():
+                entries.append((os.path.relpath(e.path, input_dir), e.path, e.stat()))
+    return entries
+
+
+def _survivor_key(entry: tuple):
+    """重复文件的保留规则：目录层级最浅者优先，其次相对路径字典序最小（与处理顺序无关）"""
+    return (entry[0].count(os.sep), entry[0])
+
+
+def _full_hash(file_path: str, st: os.stat_result, index: HashIndex|None, algo: str):
+    """计算全文哈希值（优先复用索引中未失效且算法一致的记录）"""
+    if index is not None:
+        file_hash = index.lookup(file_path, st, algo)
+        if file_hash is None:
+            control.throttle(st.st_size)
+            file_hash = calculate_hash(file_path, algo)
+            index.store(file_path, st, algo, file_hash)
+        return file_hash
+    control.throttle(st.st_size)
+    return calculate_hash(file_path, algo)
+
+
+PARTIAL_TAG = "partial:"    # 索引中采样哈希记录的算法前缀（全文哈希写入后覆盖采样记录）
+
+
+def _sample_hash(entry: tuple, index: HashIndex|None, algo: str)-> str:
+    """头尾采样哈希（优先复用索引中的记录）；采样已覆盖全文的小文件即为全文哈希"""
+    path, st = entry[1], entry[2]
+    if st.st_size <= 2 * PARTIAL_SIZE:
+        return _full_hash(path, st, index, algo)
+    if index is not None:
+        digest = index.lookup(path, st, PARTIAL_TAG + algo)
+        if digest is None:
+            digest = calculate_partial_hash(path, st.st_size, algo)
+            index.store(path, st, PARTIAL_TAG + algo, digest)
+        return digest
+    return calculate_partial_hash(path, st.st_size, algo)
+
+
+def _hash_groups(pool: WorkerPool, groups: list, hash_func, batch_size: int = 1)-> list:
+    """对每组候选文件计算哈希并按哈希值细分，返回仍然冲突（数量大于 1）的分组，同时更新进度"""
+    buckets = {}
+    for entry, future in pool.run(hash_func, (entry for group in groups for entry in group), batch_size):
+        try:
+            buckets.setdefault((entry[2].st_size, future.result()), []).append(entry)
+        except Exception as e:
+            print(f"[clear duplicate] 处理 {entry[0]} 失败: {str(e)}")
+            enum.set_processed(enum.get_processed() + 1)
+
+    collided = []
+    for bucket in buckets.values():
+        if len(bucket) > 1:
+            collided.append(bucket)
+        else:   # 唯一的哈希值，已确定不是重复文件
+            enum.set_processed(enum.get_processed() + 1)
+            enum.set_current_job(bucket[0][0])
+    return collided
+
+
+def find_duplicates(entries: list, pool: WorkerPool, index: HashIndex|None = None, algo: str = DEFAULT_ALGO, tiered: bool = True)-> tuple:
+    """
+    查找内容相同的文件分组，返回 (分组列表, 完整读取的文件数)，每组按保留规则排序，首个为保留文件
+    :param entries: scan_files 返回的文件列表
+    :param tiered: 分级查重：按大小分组 -> 头尾采样哈希 -> 全文哈希，只有逐级仍然冲突的文件才会被完整读取
+    索引中已有全文哈希的文件不再采样；包含这类文件的分组直接比较全文哈希，重复执行时只读取新增或修改的文件
+    """
+    if tiered:
+        # 第一级：按大小分组，大小唯一的文件不可能重复
+        by_size = {}
+        for entry in entries:
+            by_size.setdefault(entry[2].st_size, []).append(entry)
+        groups = [g for g in by_size.values() if len(g) > 1]
+        enum.set_processed(enum.get_processed() + len(entries) - sum(len(g) for g in groups))
+
+        # 索引中已有全文哈希的文件：所在分组跳过采样，其余文件只需与之比较全文哈希
+        known = set()
+        if index is not None:
+            known = {e[1] for g in groups for e in g if index.contains(e[1], e[2], algo)}
+        indexed = [g for g in groups if any(e[1] in known for e in g)]
+        groups = [g for g in groups if not any(e[1] in known for e in g)]
+
+        # 第二级：头尾采样哈希
+        groups = _hash_groups(pool, groups, lambda e: _sample_hash(e, index, algo), IO_BATCH)
+
+        # 第三级：全文哈希（采样已覆盖全文的小文件无需再次读取）
+        small = [g for g in groups if g[0][2].st_size <= 2 * PARTIAL_SIZE]
+        large = [g for g in groups if g[0][2].st_size > 2 * PARTIAL_SIZE] + indexed
+        full_hashed = sum(1 for g in large for e in g if e[1] not in known)
+        groups = small + _hash_groups(pool, large, lambda e: _full_hash(e[1], e[2], index, algo))
+    else:
+        full_hashed = len(entries)
+        groups = _hash_groups(pool, [entries], lambda e: _full_hash(e[1], e[2], index, algo))
+
+    for group in groups:
+        group.sort(key=_survivor_key)
+    return groups, full_hashed
+
+
+def clear_duplicate(input_dir: str, CPU_workers: int = 1, index_path: str|None = None, tiered: bool = False, algo: str = DEFAULT_ALGO, recursive: bool = False)-> dict:
+    """
+    多线程图片查重主函数，使用文件哈希值校验
+    :param index_path: 持久化哈希索引路径，为 None 时不使用索引（每次重新计算全部哈希）
+    :param tiered: 是否使用分级查重（大小 -> 采样哈希 -> 全文哈希），跳过不可能重复的文件
+    :param algo: 摘要算法（见 func.digest.available_algos），随哈希值一并记录在索引中
+    :param recursive: 是否递归查找子目录，整棵目录树共用同一个线程池和索引（跨目录查重）
+    """
+    index = None
     try:
         start_time = time.time()
         print(f"\n[clear duplicate] 开始图像去重: {input_dir}")
 
-        known_hashes.clear()
+        index = HashIndex(index_path) if index_path is not None else None
 
-        # 获取所有文件，保存为列表
-        file_list = []
-        for f in os.listdir(input_dir):
-            if os.path.isfile(os.path.join(input_dir, f)):
-                file_list.append(f)
-        
-        # 进度跟踪参数
+        # 一次遍历获取所有文件及其 stat
+        entries = scan_files(input_dir, recursive)
 
+        # 进度跟踪参数
         enum.clear_result()  # 清空结果
         enum.set_current_task("clear duplicate")
-        enum.set_total_jobs(len(file_list))
+        enum.set_total_jobs(len(entries))
         enum.set_processed(0)
 
-        # 创建线程池（根据 CPU 核心数自动调整）
-        with concurrent.futures.ThreadPoolExecutor(max_workers=CPU_workers) as executor:
-            # 提交所有处理任务
-            futures = [executor.submit(process_clear_duplicate, f, input_dir) for f in file_list]
-            
-            # 显示进度（可选）
-            for future in concurrent.futures.as_completed(futures):
+        # 创建线程池（I/O 密集，工作数量 <= 0 时自动调节）
+        with WorkerPool(CPU_workers, IO) as pool:
+            groups, full_hashed = find_duplicates(entries, pool, index, algo, tiered)
+
+        # 每组保留首个文件，删除其余副本
+        removed_count = 0
+        for group in groups:
+            for rel_path, path, st in group[1:]:
                 try:
-                    future.result()
+                    os.remove(path)
+                    if index is not None:
+                        index.invalidate(path)
+                    removed_count += 1
+                    print(f"[clear duplicate] {rel_path} == {group[0][0]}")
                 except Exception as e:
-                    print(f"[clear duplicate] 处理异常: {str(e)}")
-                finally:    # 记录进度
-                    enum.set_processed(enum.get_processed() + 1)
-                    enum.set_current_job(file_list[enum.get_processed() - 1])
+                    print(f"[clear duplicate] 删除 {rel_path} 失败: {str(e)}")
+            enum.set_processed(enum.get_processed() + len(group))
+            enum.set_current_job(group[0][0])
+
+        print(f"[clear duplicate] 文件总数 {len(entries)}，完整读取 {full_hashed}")
+        if index is not None:   # 清理已删除文件的记录
+            print(f"[clear duplicate] 索引命中 {index.hits}，重新计算 {index.misses}")
+            index.compact(os.path.abspath(input_dir))
 
         end_time = time.time()
         return {
             'cost_time': end_time - start_time,
-            'removed_count': len(file_list) - len(known_hashes)
+            'removed_count': removed_count,
+            'full_hashed': full_hashed,
+            'algo': algo
         }
     except Exception as e:
         print(f"\n[clear duplicate] 任务异常: {str(e)}")
+        return {'error': str(e)}
+    finally:    # 出错或取消时同样提交已计算的哈希值
+        if index is not None:
+            index.close()
+
+
+# ======================================================================================
+
+
+import func.similar as similar
+
+def _similar_hash(entry: tuple, method: str)-> tuple:
+    """计算单个文件的感知哈希，entry 为 (相对路径, 路径, 大小)"""
+    control.throttle(entry[2])
+    return similar.image_hash(entry[1], method)
+
+def find_similar(entries: list, pool: WorkerPool, threshold: int = 6, method: str = "phash")-> list:
+    """
+    查找近似图片，返回应去除的副本 [((相对路径, 路径, 大小), 相近的保留图片), ...]
+    每组相近的图片中保留像素最多（其次体积最大、路径最靠前）的一张
+    :param entries: [(相对路径, 路径, 大小), ...]
+    """
+    # 计算感知哈希（缩小尺寸解码）
+    hashed = []
+    for entry, future in pool.run(partial(_similar_hash, method=method), entries):
+        try:
+            value, pixels = future.result()
+            hashed.append((value, pixels, entry))
+        except Exception as e:
+            print(f"[clear similar] 处理 {entry[0]} 失败: {str(e)}")
+        finally:    # 记录进度
+            enum.set_processed(enum.get_processed() + 1)
+            enum.set_current_job(entry[0])
+
+    # 按质量从高到低依次插入索引，已有相近的高质量图片时去除当前图片
+    hashed.sort(key=lambda h: (-h[1], -h[2][2], h[2][0]))
+    tree = similar.BKTree()
+    removable = []
+    for value, pixels, entry in hashed:
+        matches = tree.query(value, threshold)
+        if matches:
+            removable.append((entry, min(matches)[1]))
+        else:
+            tree.add(value, entry[0])
+    return removable
+
+
+def clear_similar(input_dir: str, CPU_workers: int = 1, threshold: int = 6, method: str = "phash", recursive: bool = False)-> dict:
+    """
+    多线程近似图片查重主函数，使用感知哈希 + BK 树索引查找汉明距离不超过阈值的图片
+    :param threshold: 汉明距离阈值（64 位哈希），越大越宽松
+    :param method: 感知哈希算法 phash / dhash
+    :param recursive: 是否递归查找子目录（整棵目录树共用同一个索引）
+    每组相近的图片中保留像素最多（其次体积最大、路径最靠前）的一张，删除其余副本
+    """
+    try:
+        start_time = time.time()
+        print(f"\n[clear similar] 开始近似图像去重: {input_dir}")
+
+        # 获取所有文件及其大小
+        entries = [(rel_path, path, st.st_size) for rel_path, path, st in scan_files(input_dir, recursive)]
+
+        # 进度跟踪参数
+        enum.clear_result()  # 清空结果
+        enum.set_current_task("clear similar")
+        enum.set_total_jobs(len(entries))
+        enum.set_processed(0)
+
+        with WorkerPool(CPU_workers, CPU) as pool:
+            removable = find_similar(entries, pool, threshold, method)
+
+        # 删除相近的低质量副本
+        removed_count = 0
+        for (name, path, size), kept in removable:
+            try:
+                os.remove(path)
+                removed_count += 1
+                print(f"[clear similar] {name} ~ {kept}")
+            except Exception as e:
+                print(f"[clear similar] 删除 {name} 失败: {str(e)}")
+
+        end_time = time.time()
+        return {
+            'cost_time': end_time - start_time,
+            'removed_count': removed_count
+        }
+    except Exception as e:
+        print(f"\n[clear similar] 任务异常: {str(e)}")
+        return {'error': str(e)}
 
 
 # ======================================================================================
 
 
-def clear_cache(path: str)-> dict:
-    """ 删除 cache 目录下的所有缓存文件夹和文件 (only JPEG and PNG) """
+CACHE_SUFFIXES = (".jpg", ".png")     # 可以清除的缓存文件后缀
+
+
+def _plan_purge(path: str)-> list:
+    """
+    一次并行 scandir 遍历规划清除任务，返回 [(类型, 路径, [(文件路径, 大小), ...]), ...]
+    只包含缓存文件的子树作为一个整体删除任务（tree），其余缓存文件逐个删除（file）
+    """
+    dirs = {}   # 目录 -> (深度, 缓存文件 [(路径, 大小), ...], 是否包含其他文件（或链接）, [子目录])
+    for dir_path, depth, entries in walker.walk(path):
+        files = []
+        subdirs = []
+        other = False
+        for e in entries:
+            if e.is_dir(follow_symlinks=False):
+                subdirs.append(e.path)
+            elif e.is_file(follow_symlinks=False) and e.name.endswith(CACHE_SUFFIXES):
+                files.append((e.path, e.stat(follow_symlinks=False).st_size))
+            else:   # 其他文件（或链接）不属于缓存，所在目录不能整体删除
+                other = True
+        dirs[dir_path] = (depth, files, other, subdirs)
+
+    # 由深到浅判定：不含其他文件且所有子目录都可整体删除的目录，交由上层目录合并为一个整体删除任务
+    tasks = []
+    subtree = {}    # 可整体删除的目录 -> 子树中的所有缓存文件
+    for dir_path in sorted(dirs, key=lambda d: dirs[d][0], reverse=True):
+        depth, files, other, subdirs = dirs[dir_path]
+        if depth > 0 and not other and all(sub in subtree for sub in subdirs):   # 根目录本身保留
+            for sub in subdirs:
+                files.extend(subtree.pop(sub))
+            subtree[dir_path] = files
+            continue
+        for sub in subdirs:
+            if sub in subtree:
+                tasks.append(("tree", sub, subtree.pop(sub)))
+        for file_path, file_size in files:
+            tasks.append(("file", file_path, [(file_path, file_size)]))
+    return tasks
+
+
+def process_purge(task: tuple)-> tuple:
+    """执行单个清除任务，返回实际删除的 (文件数, 字节数)"""
+    kind, path, files = task
+    control.checkpoint()
+    try:
+        if kind == "tree":
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return len(files), sum(size for _, size in files)
+    except OSError as e:
+        print(f"[clear cache] 删除 {path} 失败: {e}")
+        removed = [size for file_path, size in files if not os.path.exists(file_path)]
+        return len(removed), sum(removed)
+
+
+def clear_cache(path: str, CPU_workers: int = 0)-> dict:
+    """
+    删除 cache 目录下的所有缓存文件夹和文件 (only JPEG and PNG)
+    一次 scandir/stat 遍历，只包含缓存文件的子目录整体删除，其余文件按微批并行删除
+    :param CPU_workers: 并行删除的工作数量，<= 0 表示自动
+    """
     if not os.path.exists(path):
         print(f"\n[clear cache] 目录不存在: {path}")
         return None
@@ -290,33 +747,53 @@ def clear_cache(path: str)-> dict:
     enum.clear_result()  # 清空结果
 
     enum.set_current_task("clear cache")
-    enum.set_total_jobs(len(os.listdir(path)))
+    enum.set_current_job("scan cache files...")
+
+    # 规划清除任务
+    tasks = _plan_purge(path)
+    enum.set_total_jobs(sum(len(t[2]) for t in tasks))
     enum.set_processed(0)
 
     enum.set_current_job("remove cache files...")
 
-    # 遍历根目录
-    for root, dirs, files in os.walk(path):
-        # 遍历根目录下的文件
-        for file in files:
-            try:
-                if file.endswith(".jpg") or file.endswith(".png"):
-                    # 删除文件
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    os.remove(file_path)
-
-                    total_jobs += 1
-                    total_size += file_size
-                    print(f"[clear cache] delete file: {file_path}")
-            except Exception as e:
-                print(f"\n任务异常: {file_path}: {e}")
-            finally:    # 记录进度
-                enum.set_processed(enum.get_processed() + 1)
-    
+    # 并行删除：整棵子树逐个提交，单个文件按微批提交
+    trees = [t for t in tasks if t[0] == "tree"]
+    files = [t for t in tasks if t[0] == "file"]
+    with WorkerPool(CPU_workers, IO) as pool:
+        for group, batch_size in ((trees, 1), (files, IO_BATCH)):
+            for task, future in pool.run(process_purge, group, batch_size):
+                try:
+                    count, size = future.result()
+                    total_jobs += count
+                    total_size += size
+                except Exception as e:
+                    print(f"\n任务异常: {task[1]}: {e}")
+                finally:    # 记录进度
+                    enum.set_processed(enum.get_processed() + len(task[2]))
+                    enum.set_current_job(os.path.basename(task[1]))
+
+    print(f"[clear cache] 已删除 {total_jobs} 个文件, {total_size} B")
     end_time = time.time()
     return {
         'cost_time': end_time - start_time,
         'removed_count': total_jobs,
         'total_size': total_size
     }
+
+
+# ======================================================================================
+
+
+if __name__ == "__main__":
+    # 编码档位校准命令: python -m func.filter calibrate <图像目录> [-n 样本数量]
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m func.filter")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="用样本图像测量各编码档位的吞吐量与输出体积")
+    cal.add_argument("input_dir")
+    cal.add_argument("-n", "--sample", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        calibrate_profiles(args.input_dir, args.sample)
@@ -0,0 +1,110 @@
+# x. 文件哈希索引（持久化），按 路径 + 大小 + 修改时间 + inode 复用已计算的哈希值，并记录摘要算法
+
+import os
+import time
+import sqlite3
+from threading import Lock
+
+
+SCHEMA_VERSION = 2  # 索引结构版本，不一致时重建索引（索引仅为缓存，可安全丢弃）
+COMMIT_BATCH = 256      # 每写入多少条记录提交一次
+COMMIT_INTERVAL = 2.0   # 距上次提交超过多少秒时提交（任务中断时最多丢失最近一批记录）
+
+
+class HashIndex:
+    """
+    基于 SQLite 的磁盘哈希索引，文件未变化时直接复用记录的哈希值
+    :param db_path: 索引数据库文件路径
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.lock = Lock()  # 多线程共享同一连接，使用锁串行化访问
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS hashes")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, algo TEXT, digest TEXT)"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0    # 尚未提交的写入数量
+        self.last_commit = time.monotonic()
+
+    def _written(self):
+        """记录一次写入，按数量或时间间隔提交（调用方已持有锁）"""
+        self.pending += 1
+        if self.pending >= COMMIT_BATCH or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self.conn.commit()
+            self.pending = 0
+            self.last_commit = time.monotonic()
+
+    def _get(self, path: str, st: os.stat_result, algo: str)-> str|None:
+        """读取未失效的记录（调用方已持有锁）"""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, algo, digest FROM hashes WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[:4] == (st.st_size, st.st_mtime_ns, st.st_ino, algo):
+            return row[4]
+        return None
+
+    def lookup(self, path: str, st: os.stat_result, algo: str)-> str|None:
+        """查询文件哈希值，大小/修改时间/inode/摘要算法任一不一致则视为失效"""
+        with self.lock:
+            digest = self._get(path, st, algo)
+            if digest is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return digest
+
+    def contains(self, path: str, st: os.stat_result, algo: str)-> bool:
+        """是否有未失效的记录（只用于预先判断，不计入命中统计）"""
+        with self.lock:
+            return self._get(path, st, algo) is not None
+
+    def store(self, path: str, st: os.stat_result, algo: str, digest: str):
+        """写入（或覆盖）文件哈希值及其摘要算法"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, algo, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, st.st_ino, algo, digest)
+            )
+            self._written()
+
+    def invalidate(self, path: str|None = None):
+        """使索引失效：指定路径时删除单条记录，否则清空整个索引"""
+        with self.lock:
+            if path is None:
+                self.conn.execute("DELETE FROM hashes")
+            else:
+                self.conn.execute("DELETE FROM hashes WHERE path = ?", (path,))
+            self._written()
+
+    def compact(self, prefix: str|None = None)-> int:
+        """压缩索引：删除已不存在的文件记录（可限定目录前缀），并回收数据库空间，返回删除条数"""
+        with self.lock:
+            if prefix is None:
+                rows = self.conn.execute("SELECT path FROM hashes").fetchall()
+            else:
+                prefix = os.path.join(prefix, "")
+                rows = self.conn.execute(
+                    "SELECT path FROM hashes WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+                ).fetchall()
+            stale = [(p,) for (p,) in rows if not os.path.exists(p)]
+            if stale:
+                self.conn.executemany("DELETE FROM hashes WHERE path = ?", stale)
+                self.conn.commit()
+                self.conn.execute("VACUUM")
+            return len(stale)
+
+    def close(self):
+        """提交并关闭索引"""
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,85 @@
+# x. 任务日志（断点续传）：按任务参数记录已完成的操作，任务中断后以相同参数重新执行时跳过已完成的部分
+
+import os
+import json
+import time
+import hashlib
+from threading import Lock
+
+
+class Journal:
+    """
+    只追加写入的任务日志，每行一条已完成的操作（JSON: [键, 附加信息]），按批 fsync
+    :param journal_dir: 日志目录
+    :param job: 任务名称
+    :param params: 任务参数，参数相同的任务共享同一份日志
+    :param batch: 每累计多少条记录 fsync 一次
+    :param interval: 距上次 fsync 超过多少秒时强制 fsync
+    """
+
+    def __init__(self, journal_dir: str, job: str, params: dict, batch: int = 256, interval: float = 2.0):
+        os.makedirs(journal_dir, exist_ok=True)
+        key = hashlib.sha1(json.dumps([job, params], sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(journal_dir, f"{job}-{key}.log")
+        self.batch = batch
+        self.interval = interval
+        self.lock = Lock()
+        self.done = self._load()
+        self.resumed = len(self.done)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.pending = 0
+        self.last_sync = time.time()
+        if self.resumed:
+            print(f"[journal] 继续未完成的任务 {job}，已完成 {self.resumed} 项")
+
+    def _load(self)-> dict:
+        """读取已有日志，忽略中断时写了一半的最后一行"""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    key, value = json.loads(line)
+                    done[key] = value
+                except ValueError:
+                    break
+        return done
+
+    def is_done(self, key: str)-> bool:
+        """操作是否已在之前的执行中完成"""
+        return key in self.done
+
+    def get(self, key: str):
+        """读取已完成操作的附加信息"""
+        return self.done.get(key)
+
+    def record(self, key: str, value=None):
+        """记录一条已完成的操作（按批 fsync）"""
+        with self.lock:
+            self.done[key] = value
+            self.file.write(json.dumps([key, value], ensure_ascii=False) + "\n")
+            self.pending += 1
+            if self.pending >= self.batch or time.time() - self.last_sync >= self.interval:
+                self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def sync(self):
+        """立即将已记录的操作写入磁盘"""
+        with self.lock:
+            self._sync()
+
+    def close(self, finished: bool = False):
+        """关闭日志；任务全部完成时删除日志，下次以相同参数执行时从头开始"""
+        with self.lock:
+            self._sync()
+            self.file.close()
+            if finished:
+                os.remove(self.path)
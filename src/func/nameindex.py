@@ -0,0 +1,63 @@
+# x. 目标目录文件名索引：在内存中为同名文件分配不冲突的新文件名（0A_{编号}_{文件名}），替代逐个编号调用 os.path.exists
+
+import os
+import re
+from threading import Lock
+
+
+RENAMED = re.compile(r"^0A_\d+_(.+)$")    # 冲突重命名后的文件名，分组为原始文件名
+
+
+class NameIndex:
+    """
+    每个目标目录首次使用时 scandir 加载一次已有文件名，之后的冲突判定和新文件名分配都在内存中完成
+    同名文件的下一个候选编号按 (目录, 文件名) 记录，分配为均摊 O(1)；所有分配在同一把锁内进行，并发复制时不会分配到相同的文件名
+    文件名按 os.path.normcase 比较（Windows 下不区分大小写）
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.names = {}     # 目录 -> 已占用的文件名集合
+        self.counters = {}  # (目录, 文件名) -> 下一个候选编号
+        self.snapshot = {}  # 目录 -> {原始文件名: [加载时已存在的同名文件（含重命名版本）]}
+
+    def _load(self, dst_dir: str)-> set:
+        """读取目录中已有的文件名（目录不存在时为空）"""
+        names = set()
+        variants = {}
+        if os.path.isdir(dst_dir):
+            with os.scandir(dst_dir) as it:
+                for e in it:
+                    names.add(os.path.normcase(e.name))
+                    if e.is_file():
+                        m = RENAMED.match(e.name)
+                        variants.setdefault(os.path.normcase(m.group(1) if m else e.name), []).append(e.name)
+        self.snapshot[dst_dir] = variants
+        return names
+
+    def variants(self, dst_dir: str, name: str)-> list:
+        """目录加载时已存在的同名文件路径（name 及其重命名版本 0A_{编号}_name）"""
+        with self.lock:
+            if dst_dir not in self.names:
+                self.names[dst_dir] = self._load(dst_dir)
+            return [os.path.join(dst_dir, n) for n in self.snapshot[dst_dir].get(os.path.normcase(name), [])]
+
+    def claim(self, dst_dir: str, name: str)-> str:
+        """为文件分配目标目录中不冲突的文件名并标记为已占用，返回目标路径"""
+        with self.lock:
+            names = self.names.get(dst_dir)
+            if names is None:
+                names = self.names[dst_dir] = self._load(dst_dir)
+
+            new_name = name
+            if os.path.normcase(name) in names:
+                key = (dst_dir, os.path.normcase(name))
+                counter = self.counters.get(key, 1)
+                while True:
+                    new_name = f"0A_{counter}_{name}"
+                    counter += 1
+                    if os.path.normcase(new_name) not in names:
+                        break
+                self.counters[key] = counter
+            names.add(os.path.normcase(new_name))
+            return os.path.join(dst_dir, new_name)
@@ -0,0 +1,237 @@
+# x. 流式过滤流水线：每个源文件只读取一次，依次经过 分类 -> 哈希 -> 质量分桶 -> 写出，阶段之间使用有界队列连接
+
+import os
+import io
+import time
+import queue
+import threading
+from PIL import Image
+
+import func.enum as enum
+import func.filter as filter
+import func.control as control
+from func.file import atomic_path
+from func.digest import calculate_bytes_hash, DEFAULT_ALGO
+from func.budget import DecodeBudget
+from func.pool import max_workers, AUTO, CPU
+from func.journal import Journal
+
+
+##
+# To use this script, you need to offer the following configuration:
+##
+example_config = {
+    'by_mode': True,
+    'by_quality': True,
+    'cls_duplicate': True,
+    'quality_boundary': 500,
+    'memory_budget_MB': 2048,
+    'encoder_profile': 'archival'
+}
+
+_DONE = object()    # 队列结束标记
+
+BUFFER_BYTES = 512 * 1024 * 1024    # 各阶段队列中文件数据的总字节数上限（单个更大的文件独占）
+
+
+def _read_stage(input_dir: str, read_q: queue.Queue, CPU_workers: int, journal: Journal|None, buffer: DecodeBudget, errors: list):
+    """
+    读取阶段：顺序读取源目录下的文件（每个文件只读取一次），跳过日志中已完成的文件
+    读取前按文件大小向 buffer 申请额度，写出阶段处理完成后归还，内存中的文件数据总量有上限
+    取消时停止读取，下游阶段处理完队列中的文件后结束；无法读取源目录时记录到 errors
+    """
+    try:
+        with os.scandir(input_dir) as it:
+            for e in it:
+                if not e.is_file():
+                    continue
+                if journal is not None and journal.is_done("pipeline:" + e.name):
+                    enum.set_total_jobs(enum.get_total_jobs() + 1)
+                    enum.add_processed()    # 写出阶段同时在更新进度
+                    continue
+                size = 0
+                try:
+                    st = e.stat()
+                    size = st.st_size
+                    control.throttle(size)
+                    buffer.acquire(size)    # 队列中的数据总量超出上限时等待写出阶段归还
+                    try:
+                        with open(e.path, "rb") as f:
+                            data = f.read()
+                    except BaseException:
+                        buffer.release(size)
+                        raise
+                    enum.set_total_jobs(enum.get_total_jobs() + 1)
+                    read_q.put((e.name, data, st, size))  # 队列已满时阻塞，限制内存中的文件数量
+                except Exception as ex:
+                    print(f"[pipeline] 读取 {e.name} 失败: {str(ex)}")
+    except control.Cancelled:
+        pass
+    except OSError as ex:   # 无法读取源目录
+        print(f"[pipeline] 无法读取 {input_dir}: {str(ex)}")
+        errors.append(str(ex))
+    finally:
+        for _ in range(CPU_workers):
+            read_q.put(_DONE)
+
+
+def _classify_stage(read_q: queue.Queue, write_q: queue.Queue, by_mode: bool, cls_duplicate: bool, algo: str, profile: str):
+    """分类与哈希阶段：按需在内存中完成格式转换（无需转换的图像保留原始字节），并计算输出内容的哈希值"""
+    while True:
+        item = read_q.get()
+        if item is _DONE:
+            write_q.put(_DONE)
+            return
+        src_name, data, st, size = item
+        name = src_name
+        try:
+            fmt = None
+            converted = False
+            if by_mode:
+                with Image.open(io.BytesIO(data)) as img:
+                    fmt, suffix = filter.target_format(img)
+                    if filter.needs_convert(img, fmt):
+                        with filter.reserve_decode(img, fmt):   # 按内存预算准入解码
+                            img.load()
+                            buffer = io.BytesIO()
+                            filter.encode_image(img, buffer, fmt, profile)
+                            data = buffer.getvalue()
+                        converted = True
+                name = os.path.splitext(name)[0] + suffix
+            digest = calculate_bytes_hash(data, algo) if cls_duplicate else None
+            write_q.put((src_name, name, data, st, fmt, digest, converted, size))
+        except Exception as e:
+            print(f"[pipeline] 处理 {name} 失败: {str(e)}")
+            write_q.put((src_name, name, None, st, None, None, False, size))
+
+
+def _write_file(path: str, data: bytes, st: os.stat_result, keep_mtime: bool):
+    """写出文件，未重新编码的文件保留源文件的修改时间"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as tmp:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if keep_mtime:
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _restore_written(journal: Journal)-> dict:
+    """从任务日志恢复已写出文件的哈希记录，续传时继续对之前写出的文件查重"""
+    written = {}
+    for key, value in journal.done.items():
+        if key.startswith("pipeline:") and value and value[1] is not None and os.path.exists(value[2]):
+            kept = written.get(value[0])
+            if kept is None or value[1] < kept[0]:
+                written[value[0]] = (value[1], value[2])
+    return written
+
+
+def run_filter(image_source: str, output: str, CPU_workers: int, conf: dict, algo: str = DEFAULT_ALGO, journal: Journal|None = None)-> dict:
+    """
+    流式执行过滤任务（按模式、查重、按质量），每个文件只读取一次、写出一次，不经过缓存目录
+    :param conf: 任务配置，见 example_config
+    :param journal: 任务日志，跳过之前执行中已完成的文件（断点续传）
+    """
+    try:
+        start_time = time.time()
+        print(f"\n[pipeline] 开始流式过滤: {image_source}")
+
+        by_mode = conf['by_mode']
+        by_quality = conf['by_quality']
+        cls_duplicate = conf['cls_duplicate']
+        quality_boundary = int(conf['quality_boundary']) if by_quality else 0
+        memory_budget_MB = int(conf.get('memory_budget_MB', 0))
+        profile = conf.get('encoder_profile', filter.DEFAULT_PROFILE)
+        if CPU_workers <= AUTO:     # 自动模式：转换阶段按 CPU 核心数启动工作线程
+            CPU_workers = max_workers(CPU)
+
+        # 进度跟踪参数
+        enum.clear_result()  # 清空结果
+        enum.set_current_task("pipeline")
+        enum.set_total_jobs(0)
+        enum.set_processed(0)
+
+        # 解码内存预算
+        if memory_budget_MB > 0:
+            filter.set_decode_budget(DecodeBudget(memory_budget_MB * 1024 * 1024))
+
+        # 有界队列连接各阶段，内存中最多保留约 4 * CPU_workers 个文件，且文件数据总量不超过 buffer 上限
+        read_q = queue.Queue(maxsize=CPU_workers * 2)
+        write_q = queue.Queue(maxsize=CPU_workers * 2)
+        buffer_bytes = min(BUFFER_BYTES, memory_budget_MB * 1024 * 1024) if memory_budget_MB > 0 else BUFFER_BYTES
+        buffer = DecodeBudget(buffer_bytes)
+        errors = []
+
+        threads = [threading.Thread(target=_read_stage, args=(image_source, read_q, CPU_workers, journal, buffer, errors), daemon=True)]
+        for _ in range(CPU_workers):
+            threads.append(threading.Thread(target=_classify_stage, args=(read_q, write_q, by_mode, cls_duplicate, algo, profile), daemon=True))
+        for t in threads:
+            t.start()
+
+        # 写出阶段（当前线程）：查重判定 -> 质量分桶 -> 写出
+        written = _restore_written(journal) if journal is not None else {}    # 哈希值 -> (文件名, 输出路径)
+        written_count = 0
+        removed_count = 0
+        finished = 0
+        while finished < CPU_workers:
+            item = write_q.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            src_name, name, data, st, fmt, digest, converted, size = item
+            try:
+                if data is None:
+                    continue
+
+                # 根据格式和质量确定输出目录
+                out_dir = output
+                if fmt is not None:
+                    out_dir = os.path.join(out_dir, fmt)
+                if by_quality:
+                    out_dir = os.path.join(out_dir, filter.quality_bucket(len(data), quality_boundary))
+                out_path = os.path.join(out_dir, name)
+
+                # 查重：与 clear_duplicate 相同的保留规则（文件名最靠前者保留），后到的更优副本替换已写出的副本
+                if digest is not None:
+                    kept = written.get(digest)
+                    if kept is not None:
+                        removed_count += 1
+                        if name >= kept[0]:
+                            print(f"[pipeline] duplicate {name} == {kept[0]}")
+                            if journal is not None:
+                                journal.record("pipeline:" + src_name, [digest, None, None])
+                            continue
+                        os.remove(kept[1])
+                        written_count -= 1
+                        print(f"[pipeline] duplicate {kept[0]} == {name}")
+                    written[digest] = (name, out_path)
+
+                _write_file(out_path, data, st, not converted)
+                written_count += 1
+                if journal is not None:
+                    journal.record("pipeline:" + src_name, [digest, name, out_path])
+            except Exception as e:
+                print(f"[pipeline] 写出 {name} 失败: {str(e)}")
+            finally:    # 归还数据额度，记录进度
+                item = data = None
+                buffer.release(size)
+                enum.add_processed()
+                enum.set_current_job(name)
+
+        for t in threads:
+            t.join()
+        control.checkpoint()    # 读取阶段因取消提前结束时，在队列排空后向上传递取消
+        if errors:
+            return {'error': errors[0]}
+
+        end_time = time.time()
+        return {
+            'cost_time': end_time - start_time,
+            'written_count': written_count,
+            'removed_count': removed_count
+        }
+    except Exception as e:
+        print(f"\n[pipeline] 任务异常: {str(e)}")
+        return {'error': str(e)}
+    finally:
+        filter.set_decode_budget(None)
@@ -0,0 +1,106 @@
+# x. 操作计划：任务以流的形式生成可序列化的操作（创建目录/复制/移动/重命名/删除及其大小），可估算耗时（dry-run），或按块排序后分批执行
+
+import json
+from collections import namedtuple
+
+
+MKDIR = "mkdir"
+COPY = "copy"       # 复制文件数据
+MOVE = "move"       # 跨设备移动：复制后删除源文件
+RENAME = "rename"   # 同一设备内移动：只修改目录项
+DELETE = "delete"
+RMDIR = "rmdir"
+
+DATA_OPS = (COPY, MOVE)     # 需要传输文件数据的操作
+DIR_OPS = (MKDIR, RMDIR)    # 目录操作（不计入文件数量）
+
+PLAN_CHUNK = 4096   # 执行时每次读取并排序的文件操作数量（内存中最多保留一块）
+
+# 估算用的默认速率（未设置限速时）：数据传输速率，以及每种操作每秒可完成的数量（不含数据传输）
+DEFAULT_BYTES_PER_SEC = 200 * 1024 * 1024
+DEFAULT_OPS_PER_SEC = {MKDIR: 5000, COPY: 1000, MOVE: 1000, RENAME: 5000, DELETE: 5000, RMDIR: 5000}
+
+
+# 单条操作（元组，内存占用小，可直接 JSON 序列化为列表）
+# 创建目录时 src 为 None，路径为 dst；dev 为所在目录的设备号，ino 为源文件的 inode（Windows 下 DirEntry 不提供 inode，为 0）
+Op = namedtuple("Op", ["op", "src", "dst", "size", "dev", "ino", "depth", "key", "hardlink"])
+
+
+def make_op(kind: str, src: str|None, dst: str|None = None, st=None, dev: int = 0, depth: int = 0, key: str|None = None, hardlink: bool = False)-> Op:
+    """
+    创建一条操作（st 为源文件的 stat，用于记录大小和 inode）
+    :param dev: 源文件所在目录的设备号（按目录获取一次，DirEntry.stat 在 Windows 下不提供设备号）
+    :param key: 任务日志中的键，执行成功后记录
+    """
+    size = st.st_size if st is not None and kind in DATA_OPS and not hardlink else 0
+    ino = st.st_ino if st is not None else 0
+    return Op(kind, src, dst, size, dev, ino, depth, key, hardlink)
+
+
+def locality_key(op: Op)-> tuple:
+    """
+    执行顺序：数据操作按 (设备, inode) 排序，接近磁盘上的物理布局，顺序读取；其余操作按 (设备, 路径) 排序，同一目录中的条目相邻
+    inode 为 0 时（Windows）数据操作同样退化为按路径排序
+    """
+    if op.op in DATA_OPS:
+        return (op.dev, 0, op.ino, op.src)
+    return (op.dev, 1, 0, op.src)
+
+
+class Summary:
+    """
+    操作计划的统计：各类操作的数量与需要传输的总字节数（逐条累加，不保存操作本身）
+    :param job: 任务名称
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.counts = {}
+        self.bytes = 0
+
+    def add(self, op: Op):
+        self.counts[op.op] = self.counts.get(op.op, 0) + 1
+        self.bytes += op.size
+
+    def files(self)-> int:
+        return sum(n for kind, n in self.counts.items() if kind not in DIR_OPS)
+
+    def as_dict(self)-> dict:
+        return {'job': self.job, 'ops': dict(self.counts), 'files': self.files(), 'bytes': self.bytes}
+
+    def estimate(self, bytes_per_sec: float = 0, files_per_sec: float = 0)-> dict:
+        """
+        估算执行耗时（dry-run）：数据传输时间 + 各类操作的固定开销
+        :param bytes_per_sec: 数据传输速率上限（限速），0 表示不限制（按默认速率估算）
+        :param files_per_sec: 文件处理速率上限（限速），0 表示不限制
+        """
+        rate = min(bytes_per_sec, DEFAULT_BYTES_PER_SEC) if bytes_per_sec > 0 else DEFAULT_BYTES_PER_SEC
+        seconds = self.bytes / rate
+        seconds += sum(n / DEFAULT_OPS_PER_SEC[kind] for kind, n in self.counts.items())
+        if files_per_sec > 0:
+            seconds = max(seconds, self.files() / files_per_sec)
+        return {**self.as_dict(), 'estimated_seconds': seconds}
+
+
+def save(path: str, job: str, ops):
+    """
+    边生成边保存操作计划（生成器，原样返回每条操作），JSON Lines 格式：首行为 {"job": 任务名称}，之后每行一条操作
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({'job': job}, ensure_ascii=False) + "\n")
+        for op in ops:
+            f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            yield op
+
+
+def load(path: str)-> tuple:
+    """读取保存的操作计划，返回 (任务名称, 操作生成器)"""
+    f = open(path, "r", encoding="utf-8")
+    job = json.loads(f.readline())['job']
+
+    def ops():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield Op(*json.loads(line))
+    return job, ops()
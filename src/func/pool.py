@@ -0,0 +1,212 @@
+# x. 工作池：区分 I/O 密集与 CPU 密集两类任务，自动模式下根据实测吞吐量调节并发数
+
+import os
+import time
+import concurrent.futures
+from functools import partial
+
+import func.control as control
+
+
+IO = "io"       # I/O 密集（按质量分离、哈希计算等）
+CPU = "cpu"     # CPU 密集（解码、编码）
+AUTO = 0        # 工作数量 <= 0 表示自动调节
+
+
+def max_workers(kind: str)-> int:
+    """各类任务的并发上限：CPU 任务不超过核心数，I/O 任务允许更多并发以覆盖等待时间"""
+    cpu = os.cpu_count() or 1
+    if kind == CPU:
+        return cpu
+    return min(32, cpu * 4)
+
+
+class AutoTuner:
+    """
+    爬山法调节并发数：每个测量窗口统计完成任务的吞吐量，
+    吞吐量提升则继续同方向调整，下降则反向，变化不明显时保持（即吞吐量不再提升的位置）
+    :param upper: 并发上限
+    :param window: 测量窗口（秒）
+    """
+
+    TOLERANCE = 0.05    # 吞吐量变化小于 5% 视为不再提升
+    PROBE_WINDOWS = 5   # 保持若干窗口后重新试探，适应负载变化
+
+    def __init__(self, upper: int, window: float = 1.0):
+        self.upper = max(1, upper)
+        self.limit = min(2, self.upper)
+        self.window = window
+        self.direction = 1
+        self.stable = 0
+        self.last_throughput = 0.0
+        self.window_start = time.time()
+        self.completed = 0
+
+    def record(self, n: int = 1):
+        """记录完成的任务数，窗口结束时调整并发数"""
+        self.completed += n
+        elapsed = time.time() - self.window_start
+        if elapsed < self.window:
+            return
+
+        throughput = self.completed / elapsed
+        if throughput > self.last_throughput * (1 + self.TOLERANCE):
+            self.stable = 0
+        elif throughput < self.last_throughput * (1 - self.TOLERANCE):
+            self.direction = -self.direction
+            self.stable = 0
+        else:
+            self.stable += 1
+
+        if self.stable == 0 or self.stable >= self.PROBE_WINDOWS:
+            self.limit = min(self.upper, max(1, self.limit + self.direction))
+            self.stable = 0
+
+        self.last_throughput = throughput
+        self.window_start = time.time()
+        self.completed = 0
+
+
+class WorkerPool:
+    """
+    任务池：限制同时在执行中的任务数量，固定模式下为工作数量，自动模式下由 AutoTuner 调节
+    :param workers: 工作数量，<= 0 表示自动
+    :param kind: 任务类型 IO / CPU，决定自动模式下的并发上限
+    :param use_process: 是否使用进程池
+    其余参数传递给执行器（例如进程池的 initializer）
+    """
+
+    def __init__(self, workers: int, kind: str = IO, use_process: bool = False, **executor_args):
+        self.kind = kind
+        self.tuner = AutoTuner(max_workers(kind)) if workers <= AUTO else None
+        self.size = self.tuner.upper if self.tuner is not None else workers
+        executor_cls = concurrent.futures.ProcessPoolExecutor if use_process else concurrent.futures.ThreadPoolExecutor
+        self.executor = executor_cls(max_workers=self.size, **executor_args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True)
+        return False
+
+    def limit(self)-> int:
+        """当前允许在执行中的任务数量（固定模式下多预留一倍，保证工作线程不空闲）"""
+        if self.tuner is not None:
+            return self.tuner.limit
+        return self.size * 2
+
+    def _submit(self, fn, items):
+        """
+        有界窗口提交：执行中的任务数量不超过 limit()，按完成顺序返回 (任务参数, future)
+        每次提交前经过检查点：暂停时停止提交，取消时抛出 Cancelled（退出工作池时只需等待窗口内的任务）
+        """
+        pending = {}
+        it = iter(items)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.limit():
+                control.checkpoint()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self.executor.submit(fn, item)] = item
+            if not pending:
+                return
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+
+    def run(self, fn, items, batch_size: int = 1):
+        """
+        流式提交任务并按完成顺序返回 (任务参数, future)，fn 以单个任务参数调用
+        items 可以是生成器，边遍历边提交，执行中的任务数量不超过 limit()，内存占用与任务总数无关
+        :param batch_size: 每个任务包含的参数个数（微批），减少小文件的单任务开销
+        """
+        if batch_size <= 1:
+            for item, future in self._submit(fn, items):
+                if self.tuner is not None:
+                    self.tuner.record()
+                yield item, future
+            return
+
+        for batch, future in self._submit(partial(_run_batch, fn), batched(items, batch_size)):
+            if self.tuner is not None:
+                self.tuner.record(len(batch))
+            try:
+                outcomes = future.result()
+            except Exception as e:  # 整批失败（例如工作进程异常退出）
+                outcomes = [(None, e)] * len(batch)
+            for item, (result, error) in zip(batch, outcomes):
+                yield item, _completed(result, error)
+
+    def run_ordered(self, fn, items):
+        """
+        同 run，但按提交顺序返回 (任务参数, future)：先完成的任务在重排缓冲中等待之前的任务
+        重排缓冲中的任务也计入有界窗口，内存占用与任务总数无关
+        """
+        pending = {}    # future -> (序号, 任务参数)
+        ready = {}      # 序号 -> (任务参数, future)
+        submitted = 0
+        next_seq = 0
+        it = iter(items)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + len(ready) < self.limit():
+                control.checkpoint()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self.executor.submit(fn, item)] = (submitted, item)
+                submitted += 1
+            if not pending and not ready:
+                return
+
+            if pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    seq, item = pending.pop(future)
+                    ready[seq] = (item, future)
+                    if self.tuner is not None:
+                        self.tuner.record()
+            while next_seq in ready:
+                yield ready.pop(next_seq)
+                next_seq += 1
+
+
+def batched(items, size: int):
+    """将可迭代对象按固定大小分批（生成器）"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _run_batch(fn, batch: list)-> list:
+    """在工作线程/进程中依次执行一批任务，返回每个任务的 (结果, 异常)"""
+    outcomes = []
+    for item in batch:
+        try:
+            outcomes.append((fn(item), None))
+        except Exception as e:
+            outcomes.append((None, e))
+    return outcomes
+
+
+def _completed(result, error)-> concurrent.futures.Future:
+    """将微批中单个任务的结果包装为已完成的 future，与逐个提交时的接口保持一致"""
+    future = concurrent.futures.Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
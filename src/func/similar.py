@@ -0,0 +1,108 @@
+# x. 感知哈希（dHash / pHash）与 BK 树索引，用于查找内容相近的图片（重新保存、缩放、重新压缩的副本）
+
+import numpy as np
+from PIL import Image
+
+
+HASH_SIZE = 8       # 哈希边长，8 x 8 = 64 位
+PHASH_SCALE = 4     # pHash 在 (8*4) x (8*4) 的缩略图上做 DCT
+
+
+def _reduced_gray(img: Image.Image, width: int, height: int)-> np.ndarray:
+    """以缩小尺寸解码并转为灰度矩阵（JPEG 利用 draft 在解码阶段直接缩小，避免完整解码）"""
+    img.draft('L', (width * 4, height * 4))
+    gray = img.convert('L').resize((width, height), Image.Resampling.BILINEAR)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray)-> int:
+    """布尔矩阵转换为整数哈希值"""
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(img: Image.Image, size: int = HASH_SIZE)-> int:
+    """差值哈希：比较相邻像素的明暗关系"""
+    pixels = _reduced_gray(img, size + 1, size)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+_dct_cache = {}
+
+def _dct_matrix(n: int)-> np.ndarray:
+    """DCT-II 变换矩阵（按尺寸缓存）"""
+    if n not in _dct_cache:
+        k = np.arange(n).reshape(-1, 1)
+        i = np.arange(n).reshape(1, -1)
+        matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        matrix[0, :] = np.sqrt(1.0 / n)
+        _dct_cache[n] = matrix.astype(np.float32)
+    return _dct_cache[n]
+
+
+def phash(img: Image.Image, size: int = HASH_SIZE, scale: int = PHASH_SCALE)-> int:
+    """感知哈希：取二维 DCT 的低频分量，与中位数比较"""
+    n = size * scale
+    pixels = _reduced_gray(img, n, n)
+    matrix = _dct_matrix(n)
+    low = (matrix @ pixels @ matrix.T)[:size, :size]
+    return _bits_to_int(low > np.median(low.flatten()[1:]))   # 中位数排除直流分量
+
+
+def image_hash(img_path: str, method: str = "phash")-> tuple:
+    """计算图片的感知哈希值，返回 (哈希值, 像素数)"""
+    with Image.open(img_path) as img:
+        pixels = img.width * img.height     # 原始尺寸（读取文件头即可获得）
+        if method == "dhash":
+            return dhash(img), pixels
+        if method == "phash":
+            return phash(img), pixels
+        raise ValueError(f"不支持的感知哈希算法: {method}")
+
+
+def hamming(a: int, b: int)-> int:
+    """两个哈希值之间的汉明距离"""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    BK 树：以汉明距离为度量的索引，按阈值查询时利用三角不等式剪枝，避免两两比较
+    """
+
+    def __init__(self):
+        self.root = None    # 节点结构: [哈希值, 数据, {距离: 子节点}]
+        self.size = 0
+
+    def add(self, value: int, item):
+        """插入一个哈希值及其关联数据"""
+        self.size += 1
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, item, {}]
+                return
+            node = child
+
+    def query(self, value: int, threshold: int)-> list:
+        """查找距离不超过阈值的所有数据，返回 [(距离, 数据), ...]"""
+        results = []
+        if self.root is None:
+            return results
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= threshold:
+                results.append((d, node[1]))
+            for dist, child in node[2].items():
+                if d - threshold <= dist <= d + threshold:
+                    stack.append(child)
+        return results
@@ -0,0 +1,124 @@
+# x. 虚拟暂存：以文件清单代替缓存目录中的完整副本，直接在源文件上查重、近似查重和按质量分桶（不修改源文件），只有最终输出的文件才会写入
+
+import os
+import time
+
+import func.enum as enum
+import func.filter as filter
+import func.file as file
+from func.digest import DEFAULT_ALGO
+from func.hashindex import HashIndex
+from func.journal import Journal
+from func.pool import WorkerPool, IO, CPU
+
+
+def _emit_path(output: str, rel_path: str, st: os.stat_result, by_quality: bool, quality_boundary: int)-> str:
+    """清单条目的输出路径：按质量分桶时为 output/桶/相对路径，否则为 output/相对路径"""
+    if by_quality:
+        return os.path.join(output, filter.quality_bucket(st.st_size, quality_boundary), rel_path)
+    return os.path.join(output, rel_path)
+
+
+def _skip_emitted(item: tuple, journal: Journal)-> bool:
+    """已输出的文件直接计入进度"""
+    if journal.is_done("staged:" + item[0]):
+        enum.set_processed(enum.get_processed() + 1)
+        return True
+    return False
+
+
+def run_staged(image_source: str, output: str, CPU_workers: int, conf: dict, index_path: str|None = None, algo: str = DEFAULT_ALGO, journal: Journal|None = None)-> dict:
+    """
+    虚拟暂存过滤（不按模式分类时）：清单 -> 查重 -> 近似查重 -> 按质量分桶 -> 输出
+    查重和近似查重只从清单中去除副本，源文件保持不变；输出时优先使用 reflink / 硬链接（见 fastcopy），否则复制
+    :param conf: 任务配置（by_quality, cls_duplicate, cls_similar, quality_boundary, staging_hardlink）
+    :param index_path: 源文件的持久化哈希索引，重复执行时复用已计算的哈希值
+    :param journal: 任务日志，跳过之前执行中已输出的文件
+    """
+    index = None
+    try:
+        start_time = time.time()
+        print(f"\n[staged] 开始过滤（虚拟暂存）: {image_source}")
+
+        by_quality = conf['by_quality']
+        quality_boundary = int(conf['quality_boundary']) if by_quality else 0
+        hardlink = conf.get('staging_hardlink', False)
+
+        # 清单：一次遍历获取所有源文件及其 stat
+        entries = filter.scan_files(image_source, recursive=True)
+        total = len(entries)
+
+        # 查重：每组保留首个文件，其余副本只从清单中去除
+        if conf['cls_duplicate']:
+            enum.clear_result()
+            enum.set_current_task("clear duplicate")
+            enum.set_total_jobs(len(entries))
+            enum.set_processed(0)
+            index = HashIndex(index_path) if index_path is not None else None
+            with WorkerPool(CPU_workers, IO) as pool:
+                groups, full_hashed = filter.find_duplicates(entries, pool, index, algo, tiered=True)
+            dropped = set()
+            for group in groups:
+                for rel_path, path, st in group[1:]:
+                    dropped.add(path)
+                    print(f"[staged] duplicate {rel_path} == {group[0][0]}")
+                enum.set_processed(enum.get_processed() + len(group))
+            entries = [e for e in entries if e[1] not in dropped]
+            print(f"[staged] 文件总数 {total}，完整读取 {full_hashed}，重复 {len(dropped)}")
+
+        # 近似查重：相近的低质量副本只从清单中去除
+        if conf.get('cls_similar', False):
+            enum.clear_result()
+            enum.set_current_task("clear similar")
+            enum.set_total_jobs(len(entries))
+            enum.set_processed(0)
+            with WorkerPool(CPU_workers, CPU) as pool:
+                removable = filter.find_similar([(rel_path, path, st.st_size) for rel_path, path, st in entries], pool)
+            dropped = set()
+            for (rel_path, path, size), kept in removable:
+                dropped.add(path)
+                print(f"[staged] similar {rel_path} ~ {kept}")
+            entries = [e for e in entries if e[1] not in dropped]
+
+        # 输出：根据清单中的 stat 结果分桶，只有保留的文件才会写入
+        enum.clear_result()
+        enum.set_current_task("emit")
+        enum.set_total_jobs(len(entries))
+        enum.set_processed(0)
+        items = (
+            (rel_path, path, _emit_path(output, rel_path, st, by_quality, quality_boundary))
+            for rel_path, path, st in entries
+        )
+        if journal is not None:     # 跳过之前已输出的文件（断点续传）
+            items = (item for item in items if not _skip_emitted(item, journal))
+
+        methods = {}
+        with WorkerPool(CPU_workers, IO) as pool:
+            for (rel_path, path, dst), future in pool.run(lambda item: file.copy_1file(item[1], item[2], hardlink), items):
+                try:
+                    method = future.result()
+                    methods[method] = methods.get(method, 0) + 1
+                    if journal is not None:
+                        journal.record("staged:" + rel_path)
+                except Exception as e:
+                    print(f"[staged] 输出 {rel_path} 失败: {str(e)}")
+                finally:    # 记录进度
+                    enum.set_processed(enum.get_processed() + 1)
+                    enum.set_current_job(rel_path)
+
+        end_time = time.time()
+        print(f"[staged] 输出 {len(entries)}/{total}: {methods}")
+        return {
+            'cost_time': end_time - start_time,
+            'emitted': len(entries),
+            'removed_count': total - len(entries),
+            'methods': methods
+        }
+    except Exception as e:
+        print(f"\n[staged] 任务异常: {str(e)}")
+        return {'error': str(e)}
+    finally:
+        if index is not None:
+            index.compact(os.path.abspath(image_source))
+            index.close()
+
@@ -0,0 +1,145 @@
+# x. 并行目录遍历：多个工作线程以工作窃取队列分担目录的 scandir（网络挂载、海量目录时目录枚举本身就是瓶颈），所有文件工具共用
+
+import os
+import queue
+import threading
+from collections import deque
+
+from func.pool import max_workers, IO, AUTO
+
+
+WALK_WORKERS = min(16, max_workers(IO))     # 自动模式下的遍历线程数量
+
+_DONE = object()    # 遍历结束标记
+
+
+class _Walker:
+    """
+    工作窃取遍历：每个线程有自己的目录双端队列，新发现的子目录压入自己队列的尾部并优先从尾部取出（深度优先，局部性好），
+    自己的队列为空时从其他线程队列的头部窃取（较浅的目录，通常包含更大的子树）
+    遍历结果经有界队列交给调用方，调用方处理较慢时遍历线程自动等待
+    """
+
+    def __init__(self, top: str, workers: int, prune, stat: bool):
+        self.prune = prune
+        self.stat = stat
+        self.deques = [deque() for _ in range(workers)]
+        self.deques[0].append((top, 0))
+        self.pending = 1    # 已发现但尚未处理完的目录数量
+        self.cond = threading.Condition()
+        self.out = queue.Queue(maxsize=workers * 4)
+        self.stopped = False
+        self.threads = [threading.Thread(target=self._work, args=(i,), daemon=True) for i in range(workers)]
+
+    def _take(self, i: int):
+        """取出一个目录：先从自己队列的尾部取，否则从其他队列的头部窃取（deque 的 pop / popleft 是线程安全的）"""
+        try:
+            return self.deques[i].pop()
+        except IndexError:
+            pass
+        n = len(self.deques)
+        for k in range(1, n):
+            try:
+                return self.deques[(i + k) % n].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _put(self, item)-> bool:
+        """交给调用方（调用方已停止遍历时放弃）"""
+        while not self.stopped:
+            try:
+                self.out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _scan(self, path: str, depth: int, i: int):
+        """
+        读取单个目录，子目录压入自己的队列，返回目录中的条目
+        单个条目出错（例如在 readdir 与 stat 之间被删除）时只跳过该条目；只有目录本身无法读取时才跳过整个目录
+        """
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            if self.prune is None or not self.prune(e):
+                                subdirs.append((e.path, depth + 1))
+                        elif self.stat:
+                            e.stat(follow_symlinks=False)   # 在工作线程中完成 stat，结果缓存在 DirEntry 中
+                    except OSError as ex:
+                        print(f"[walker] 跳过 {e.path}: {ex}")
+                        continue
+                    entries.append(e)
+        except OSError as ex:
+            print(f"[walker] 无法读取 {path}: {ex}")
+        if subdirs:
+            with self.cond:
+                self.pending += len(subdirs)
+                self.deques[i].extend(subdirs)
+                self.cond.notify_all()
+        return entries
+
+    def _work(self, i: int):
+        while not self.stopped:
+            item = self._take(i)
+            if item is None:
+                with self.cond:
+                    if self.pending == 0:
+                        return
+                    self.cond.wait(0.05)
+                continue
+
+            path, depth = item
+            entries = self._scan(path, depth, i)
+            self._put((path, depth, entries))
+            with self.cond:
+                self.pending -= 1
+                if self.pending == 0:   # 最后一个目录处理完成
+                    self.cond.notify_all()
+                    self._put(_DONE)
+
+    def __iter__(self):
+        for t in self.threads:
+            t.start()
+        try:
+            while True:
+                item = self.out.get()
+                if item is _DONE:
+                    return
+                yield item
+        finally:    # 调用方提前结束（或出现异常）时停止遍历线程
+            self.stopped = True
+            with self.cond:
+                self.cond.notify_all()
+
+
+def walk(top: str, workers: int = AUTO, prune=None, stat: bool = True):
+    """
+    并行遍历目录树（生成器），按目录返回 (目录路径, 相对深度, [DirEntry, ...])，根目录深度为 0
+    目录之间的返回顺序不确定；同一目录的条目一次返回
+    :param workers: 遍历线程数量，<= 0 表示自动
+    :param prune: prune(DirEntry) 为 True 的子目录不进入（仍包含在父目录的条目中）
+    :param stat: 在遍历线程中预先获取文件的 stat（DirEntry.stat() 直接返回缓存结果）
+    不跟随指向目录的符号链接
+    """
+    if workers <= AUTO:
+        workers = WALK_WORKERS
+    return iter(_Walker(top, workers, prune, stat))
+
+
+def iter_files(top: str, workers: int = AUTO, prune=None):
+    """并行遍历目录树中的所有文件（生成器），返回 (所在目录深度, DirEntry)"""
+    for path, depth, entries in walk(top, workers, prune):
+        for e in entries:
+            if not e.is_dir(follow_symlinks=False):
+                yield depth, e
+
+
+def skip_hidden(e: os.DirEntry)-> bool:
+    """prune 函数：跳过以 . 开头的隐藏目录（例如缓存目录中的哈希索引）"""
+    return e.name.startswith(".")
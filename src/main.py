@@ -79,6 +79,14 @@ class ToolboxApp:
 
         # 分隔符
         ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=5, fill=tk.Y)
+
+        # 任务控制按钮（仅在任务进行中可用）
+        self.serv = None
+        self.pause_button = ttk.Button(toolbar, text="暂停", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=2)
+
+        self.cancel_button = ttk.Button(toolbar, text="取消", command=self.cancel_task, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=2)
         
     def create_main_content(self):
         # 主内容区域使用 Notebook（标签页）
@@ -123,7 +131,7 @@ class ToolboxApp:
             self.quality_filtered_entry.insert(0, conf["quality_filtered"])
 
         # CPU 工作数量
-        tk.Label(self.tab1, text=f"CPU 工作数量 ({dconf.get_cpu_workers()})").grid(row=4, column=0, padx=20, pady=10)
+        tk.Label(self.tab1, text=f"CPU 工作数量 ({dconf.get_cpu_workers()}/auto)").grid(row=4, column=0, padx=20, pady=10)
         self.cpu_workers_entry = tk.Entry(self.tab1, width=60)
         self.cpu_workers_entry.grid(row=4, column=1, padx=20, pady=10)
         if conf["CPU_workers"] is not None:
@@ -139,6 +147,11 @@ class ToolboxApp:
         self.check_quality_var = tk.Checkbutton(self.tab1, text="按质量 / KB", variable=self.option2_var, command=None)
         self.check_quality_var.grid(row=5, column=1, columnspan=1, pady=0)
 
+        # 复选框 - 多进程（格式转换阶段）
+        self.option5_var = tk.BooleanVar(value=False)
+        self.check_process_var = tk.Checkbutton(self.tab1, text="多进程", variable=self.option5_var, command=None)
+        self.check_process_var.grid(row=6, column=0, columnspan=1, pady=0)
+
         # 输入框 - 质量
         self.quality_entry = tk.Entry(self.tab1, width=8)
         self.quality_entry.grid(row=6, column=1, columnspan=1, pady=0)
@@ -153,22 +166,38 @@ class ToolboxApp:
         self.check_clear_cache_var = tk.Checkbutton(self.tab1, text="清除缓存", variable=self.option4_var, command=None)
         self.check_clear_cache_var.grid(row=7, column=1, columnspan=1, pady=10)
 
+        # 复选框 - 近似查重（感知哈希）
+        self.option6_var = tk.BooleanVar(value=False)
+        self.check_similar_var = tk.Checkbutton(self.tab1, text="近似查重", variable=self.option6_var, command=None)
+        self.check_similar_var.grid(row=8, column=0, columnspan=1, pady=0)
+
+        # 复选框 - 流式处理（每个文件只读写一次，不使用缓存目录）
+        self.option7_var = tk.BooleanVar(value=False)
+        self.check_pipeline_var = tk.Checkbutton(self.tab1, text="流式处理", variable=self.option7_var, command=None)
+        self.check_pipeline_var.grid(row=8, column=1, columnspan=1, pady=0)
+
+        # 下拉框 - 编码档位
+        tk.Label(self.tab1, text="编码档位:").grid(row=9, column=0, padx=20, pady=10)
+        self.profile_combobox = ttk.Combobox(self.tab1, values=["fast", "balanced", "archival"], state="readonly", width=12)
+        self.profile_combobox.grid(row=9, column=1, padx=20, pady=10)
+        self.profile_combobox.set(conf["encoder_profile"])
+
         # 分类按钮 (监听点击分类操作，将参数传递给 filter_images_script)
         self.public_button = tk.Button(self.tab1, text="开始分类", command=self.filter_images_script)
-        self.public_button.grid(row=8, column=0, padx=20, pady=20)
+        self.public_button.grid(row=10, column=0, padx=20, pady=20)
 
         # 进度条
         self.progressbar = ttk.Progressbar(self.tab1, orient="horizontal", length=640, mode="determinate")
-        self.progressbar.grid(row=8, column=1, padx=20, pady=20)
+        self.progressbar.grid(row=10, column=1, padx=20, pady=20)
         self.progressbar["value"] = 0  # 初始化进度条为 0
 
         # 进度任务信息标签
         self.progress_label = tk.Label(self.tab1, text="[-/-]")
-        self.progress_label.grid(row=9, column=0, padx=10, pady=10)
+        self.progress_label.grid(row=11, column=0, padx=10, pady=10)
 
         # 进度详细信息标签
         self.progress_detail_label = tk.Label(self.tab1, text="没有正在进行的任务")
-        self.progress_detail_label.grid(row=9, column=1, padx=10, pady=10)
+        self.progress_detail_label.grid(row=11, column=1, padx=10, pady=10)
 
 
 
@@ -196,22 +225,27 @@ class ToolboxApp:
         if conf["dst"] is not None:
             self.merge_entry.insert(0, conf["dst"])
 
+        # 复选框 - 增量合并
+        self.skip_identical_var = tk.BooleanVar(value=conf["skip_identical"])
+        self.check_skip_identical = tk.Checkbutton(self.tab1, text="跳过相同文件", variable=self.skip_identical_var, command=None)
+        self.check_skip_identical.grid(row=4, column=1, padx=20, pady=10, sticky="w")
+
         # 合并按钮 (监听点击合并操作，将参数传递给 merge_script)
         self.public_button = tk.Button(self.tab1, text="开始合并", command=self.merge_script)
-        self.public_button.grid(row=4, column=0, padx=20, pady=20)
+        self.public_button.grid(row=5, column=0, padx=20, pady=20)
 
         # 进度条
         self.progressbar = ttk.Progressbar(self.tab1, orient="horizontal", length=640, mode="determinate")
-        self.progressbar.grid(row=4, column=1, padx=20, pady=20)
+        self.progressbar.grid(row=5, column=1, padx=20, pady=20)
         self.progressbar["value"] = 0  # 初始化进度条为 0
 
         # 进度任务信息标签
         self.progress_label = tk.Label(self.tab1, text="")
-        self.progress_label.grid(row=5, column=0, padx=10, pady=10)
+        self.progress_label.grid(row=6, column=0, padx=10, pady=10)
 
         # 进度详细信息标签
         self.progress_detail_label = tk.Label(self.tab1, text="没有正在进行的任务")
-        self.progress_detail_label.grid(row=5, column=1, padx=10, pady=10)
+        self.progress_detail_label.grid(row=6, column=1, padx=10, pady=10)
 
     def create_settings3_ui(self, conf):
         self.clear_settings_ui()
@@ -239,22 +273,27 @@ class ToolboxApp:
 
         tk.Label(self.tab1, text="（留空则不生成子文件夹）").grid(row=4, column=1, padx=20, pady=0)
 
+        # 复选框 - 移动文件
+        self.move_var = tk.BooleanVar(value=conf["move"])
+        self.check_move = tk.Checkbutton(self.tab1, text="移动文件（删除源文件）", variable=self.move_var, command=None)
+        self.check_move.grid(row=5, column=1, padx=20, pady=10, sticky="w")
+
         # 提取按钮 (监听点击提取操作，将参数传递给 extract_script)
         self.public_button = tk.Button(self.tab1, text="开始提取", command=self.extract_script)
-        self.public_button.grid(row=4, column=0, padx=20, pady=20)
+        self.public_button.grid(row=6, column=0, padx=20, pady=20)
 
         # 进度条
         self.progressbar = ttk.Progressbar(self.tab1, orient="horizontal", length=640, mode="determinate")
-        self.progressbar.grid(row=4, column=1, padx=20, pady=20)
+        self.progressbar.grid(row=6, column=1, padx=20, pady=20)
         self.progressbar["value"] = 0  # 初始化进度条为 0
 
         # 进度任务信息标签
         self.progress_label = tk.Label(self.tab1, text="")
-        self.progress_label.grid(row=5, column=0, padx=10, pady=10)
+        self.progress_label.grid(row=7, column=0, padx=10, pady=10)
 
         # 进度详细信息标签
         self.progress_detail_label = tk.Label(self.tab1, text="没有正在进行的任务")
-        self.progress_detail_label.grid(row=5, column=1, padx=10, pady=10)
+        self.progress_detail_label.grid(row=7, column=1, padx=10, pady=10)
 
     def create_settings4_ui(self, conf):
         self.clear_settings_ui()
@@ -340,7 +379,34 @@ class ToolboxApp:
         self.create_settings4_ui(dconf.script4_conf)
 
 
+    def toggle_pause(self):
+        # 暂停 / 继续当前任务
+        if self.serv is None:
+            return
+        if self.serv.is_paused():
+            self.serv.resume()
+            self.pause_button.config(text="暂停")
+            self.status_bar.config(text=" 任务进行中")
+        else:
+            self.serv.pause()
+            self.pause_button.config(text="继续")
+            self.status_bar.config(text=" 已暂停")
+
+    def cancel_task(self):
+        # 取消当前任务（等待执行中的文件完成后结束）
+        if self.serv is None:
+            return
+        self.serv.cancel()
+        self.pause_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_bar.config(text=" 正在取消...")
+
     def check_progress(self, serv: service.Service):
+        if self.serv is not serv:   # 新任务开始，启用任务控制按钮
+            self.serv = serv
+            self.pause_button.config(text="暂停", state=tk.NORMAL)
+            self.cancel_button.config(state=tk.NORMAL)
+            self.status_bar.config(text=" 任务进行中")
         if serv.get_processing():
             # 更新进度显示
             result = serv.get_result()
@@ -355,6 +421,9 @@ class ToolboxApp:
             self.master.after(100, lambda: self.check_progress(serv))  # 每 100 毫秒检查一次
         else:
             self.enable_button()    # 恢复按钮和样式
+            self.pause_button.config(text="暂停", state=tk.DISABLED)
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_bar.config(text=" 就绪")
 
 
     def filter_images_script(self):
@@ -375,8 +444,15 @@ class ToolboxApp:
             'by_quality': by_quality,
             'cls_duplicate': self.option3_var.get(),
             'cls_cache': self.option4_var.get(),
-
-            'quality_boundary': quality_boundary
+            'use_process': self.option5_var.get(),
+            'cls_similar': self.option6_var.get(),
+            'pipeline': self.option7_var.get(),
+
+            'quality_boundary': quality_boundary,
+            'memory_budget_MB': dconf.script1_conf['memory_budget_MB'],
+            'staging_hardlink': dconf.script1_conf['staging_hardlink'],
+            'virtual_staging': dconf.script1_conf['virtual_staging'],
+            'encoder_profile': self.profile_combobox.get()
         }
 
         # 检查是否所有参数都已输入
@@ -387,10 +463,10 @@ class ToolboxApp:
 
         # 开始一个新线程来执行过滤
         serv = service.Service()
+        serv.set_processing()  # 在任务线程启动前清除上一任务的暂停/取消标记并应用限速
         threading.Thread(target=serv.start_filter, args=(image_source, mode_separated, quality_filtered, cpu_workers, conf)).start()
 
         # 启动定期检查进度
-        serv.set_processing()
         self.progressbar["value"] = 0   # 清空进度条
         self.check_progress(serv)
 
@@ -402,6 +478,7 @@ class ToolboxApp:
         src1 = self.source1_entry.get()
         src2 = self.source2_entry.get()
         dst = self.merge_entry.get()
+        skip_identical = self.skip_identical_var.get()
 
         # 检查是否所有参数都已输入
         if src1 == "" or src2 == "" or dst == "":
@@ -411,10 +488,10 @@ class ToolboxApp:
 
         # 创建服务实例并调用方法
         serv = service.Service()
-        threading.Thread(target=serv.start_merge, args=(src1, src2, dst)).start()
+        serv.set_processing()  # 在任务线程启动前清除上一任务的暂停/取消标记并应用限速
+        threading.Thread(target=serv.start_merge, args=(src1, src2, dst, skip_identical)).start()
 
         # 启动定期检查进度
-        serv.set_processing()
         self.progressbar["value"] = 0   # 清空进度条
         self.check_progress(serv)
         
@@ -428,6 +505,7 @@ class ToolboxApp:
         src = self.source_entry.get()
         dst = self.extract_entry.get()
         target_dir = self.target_dir_entry.get()
+        move = self.move_var.get()
 
         # 检查是否所有参数都已输入
         if src == "" or dst == "":
@@ -440,10 +518,10 @@ class ToolboxApp:
 
         # 创建服务实例并调用方法
         serv = service.Service()
-        threading.Thread(target=serv.start_extract, args=(src, dst, target_dir)).start()
+        serv.set_processing()  # 在任务线程启动前清除上一任务的暂停/取消标记并应用限速
+        threading.Thread(target=serv.start_extract, args=(src, dst, target_dir, move)).start()
 
         # 启动定期检查进度
-        serv.set_processing()
         self.progressbar["value"] = 0   # 清空进度条
         self.check_progress(serv)        
 
@@ -463,10 +541,10 @@ class ToolboxApp:
 
         # 创建服务实例并调用方法
         serv = service.Service()
+        serv.set_processing()  # 在任务线程启动前清除上一任务的暂停/取消标记并应用限速
         threading.Thread(target=serv.start_delete, args=(target, only_empty)).start()
 
         # 启动定期检查进度
-        serv.set_processing()
         self.progressbar["value"] = 0   # 清空进度条
         self.check_progress(serv)     
 
@@ -491,11 +569,15 @@ class ToolboxApp:
 
 
 import ctypes
-
-# 在创建 Tk 实例前调用
-ctypes.windll.shcore.SetProcessDpiAwareness(1)  # 系统级 DPI 感知
+import multiprocessing
 
 if __name__ == "__main__":
+    # 打包后的可执行文件中，进程池的子进程在此处直接进入工作进程逻辑，不再启动界面
+    multiprocessing.freeze_support()
+
+    # 在创建 Tk 实例前调用
+    ctypes.windll.shcore.SetProcessDpiAwareness(1)  # 系统级 DPI 感知
+
     root = tk.Tk()
     
     # 替换默认字体
@@ -1,8 +1,13 @@
 # 2. 服务层
 
 import func.filter as filter
+import func.pipeline as pipeline
+import func.staging as staging
 import func.file as file
 import func.enum as enum
+import func.control as control
+from func.journal import Journal
+import conf as dconf
 
 import os
 import time 
@@ -14,6 +19,23 @@ class Service:
     def set_processing(self):
         global is_processing
         is_processing = True
+        # 新任务清除暂停、取消标记，并应用限速配置
+        control.state.reset()
+        control.state.set_limits(dconf.control_conf['MB_per_sec'] * 1024 * 1024, dconf.control_conf['files_per_sec'])
+
+    def pause(self):
+        """暂停任务：工作线程在处理下一个文件前阻塞"""
+        control.state.pause()
+
+    def resume(self):
+        control.state.resume()
+
+    def is_paused(self)-> bool:
+        return control.state.is_paused()
+
+    def cancel(self):
+        """取消任务：停止提交新文件，等待执行中的文件完成后结束（不会留下写了一半的文件）"""
+        control.state.cancel()
 
     def get_processing(self):
         return is_processing
@@ -27,73 +49,141 @@ class Service:
         global is_processing
         is_processing = False
 
+    def _open_journal(self, job: str, params: dict)-> Journal:
+        """打开任务日志，以相同参数重新执行中断的任务时从断点继续"""
+        return Journal(os.path.join(dconf.cache, "journal"), job, params)
+
+    def _run_stage(self, journal: Journal, stage: str, fn, *args, **kwargs)-> bool:
+        """执行一个任务阶段，跳过之前执行中已完成的阶段；返回该阶段是否成功"""
+        if journal.is_done("stage:" + stage):
+            print(f"[journal] 跳过已完成的阶段 {stage}")
+            return True
+        result = fn(*args, **kwargs)
+        if isinstance(result, dict) and 'error' in result:
+            return False
+        journal.record("stage:" + stage)
+        return True
+
     def start_filter(self, image_source: str, cache: str, output: str, cpu_workers: str, conf: dict):
-        """ 按格式和质量分类，查重，并删除重复文件 """
-        cpu_workers = int(cpu_workers)
+        """ 按格式和质量分类，查重，并删除重复文件；cpu_workers 为 auto（或 0）时各阶段自动调节并发数 """
+        cpu_workers = 0 if cpu_workers.strip().lower() == "auto" else int(cpu_workers)
 
         by_mode = conf['by_mode']
         by_quality = conf['by_quality']
         cls_duplicate = conf['cls_duplicate']
         cls_cache = conf['cls_cache']
-
-        # 规划任务流程
-        last = False
-        if by_mode:         # 按模式分类
-            filter.separate_mode(image_source, cache, cpu_workers)
-            last = True
-        else:
-            file.copy_tree(image_source, cache+"\\tmp", None)
+        use_process = conf.get('use_process', False)
+        cls_similar = conf.get('cls_similar', False)
+        memory_budget_MB = int(conf.get('memory_budget_MB', 0))
+        encoder_profile = conf.get('encoder_profile', filter.DEFAULT_PROFILE)
+
+        # 任务日志（断点续传）：并发数不影响结果，不参与任务标识
+        journal = self._open_journal("filter", {'image_source': image_source, 'cache': cache, 'output': output, 'conf': conf})
+        ok = True
+        try:
+            # 流式处理：每个文件只读取一次、写出一次，不经过缓存目录
+            if conf.get('pipeline', False):
+                ok &= self._run_stage(journal, "pipeline", pipeline.run_filter, image_source, output, cpu_workers, conf, journal=journal)
+                if cls_similar:     # 近似查重（在输出目录上进行）
+                    ok &= self._run_stage(journal, "similar", filter.clear_similar, output, cpu_workers, recursive=True)
+                return
+
+            # 虚拟暂存：不按模式分类时直接在源文件上查重、分桶，只写入最终输出的文件，不复制到缓存目录
+            if not by_mode and conf.get('virtual_staging', False):
+                index_path = os.path.join(cache, ".index", "hash_index.db")
+                ok &= self._run_stage(journal, "staged", staging.run_staged, image_source, output, cpu_workers, conf, index_path, journal=journal)
+                return
+
+            # 规划任务流程
             last = False
-        if cls_duplicate:   # 查重
-            for root, dirs, files in os.walk(cache):
-                if dirs:
-                    for dir in dirs:
-                        filter.clear_duplicate(os.path.join(root, dir), cpu_workers)
-        if by_quality:      # 按质量分类
-            quality_boundary = int(conf['quality_boundary'])
-            if last:
-                filter.separate_quality(cache+"\\JPEG", output+"\\JPEG", cpu_workers, quality_boundary)
-                filter.separate_quality(cache+"\\PNG", output+"\\PNG", cpu_workers, quality_boundary)
+            if by_mode:         # 按模式分类
+                ok &= self._run_stage(journal, "mode", filter.separate_mode, image_source, cache, cpu_workers, use_process,
+                                      memory_budget_MB=memory_budget_MB, profile=encoder_profile, journal=journal,
+                                      hardlink=conf.get('staging_hardlink', False))
+                last = True
             else:
-                filter.separate_quality(cache+"\\tmp", output, cpu_workers, quality_boundary)
-        else:
-            if last:
-                file.move_files(cache+"\\JPEG", output+"\\JPEG", None)
-                file.move_files(cache+"\\PNG", output+"\\PNG", None)
+                ok &= self._run_stage(journal, "copy_tree", file.copy_tree, image_source, cache+"\\tmp", None,
+                                      hardlink=conf.get('staging_hardlink', False))
+                last = False
+            if cls_duplicate:   # 查重（整棵缓存目录树一次完成，跨目录查重）
+                index_path = os.path.join(cache, ".index", "hash_index.db")
+                ok &= self._run_stage(journal, "dedup", filter.clear_duplicate, cache, cpu_workers, index_path, tiered=True, recursive=True)
+            if cls_similar:     # 近似查重
+                ok &= self._run_stage(journal, "similar", filter.clear_similar, cache, cpu_workers, recursive=True)
+            if by_quality:      # 按质量分类
+                quality_boundary = int(conf['quality_boundary'])
+                if last:
+                    ok &= self._run_stage(journal, "quality:JPEG", filter.separate_quality, cache+"\\JPEG", output+"\\JPEG", cpu_workers, quality_boundary)
+                    ok &= self._run_stage(journal, "quality:PNG", filter.separate_quality, cache+"\\PNG", output+"\\PNG", cpu_workers, quality_boundary)
+                else:
+                    ok &= self._run_stage(journal, "quality", filter.separate_quality, cache+"\\tmp", output, cpu_workers, quality_boundary)
             else:
-                file.move_files(cache+"\\tmp", output, None)
-        if cls_cache:       # 删除缓存
-            filter.clear_cache(cache+"\\JPEG")
-            filter.clear_cache(cache+"\\PNG")
-            filter.clear_cache(cache+"\\tmp")
-
-            file.delete_dirs(cache, True)   # 同时删除空目录
-        else:
-            ...
-        # 标记任务结束
-        self.stop_processing()
+                if last:        # 按模式分类后可能没有某种格式的图片（缓存中没有对应目录）
+                    for fmt in ("JPEG", "PNG"):
+                        if os.path.isdir(cache+"\\"+fmt):
+                            ok &= self._run_stage(journal, "move:"+fmt, file.move_files, cache+"\\"+fmt, output+"\\"+fmt, None)
+                else:
+                    ok &= self._run_stage(journal, "move", file.move_files, cache+"\\tmp", output, None)
+            if cls_cache and not ok:
+                # 有阶段失败时保留缓存：任务日志中已完成的阶段在续传时会被跳过，依赖缓存中的中间结果
+                print("[service] 存在失败的阶段，保留缓存以便续传")
+            elif cls_cache:     # 删除缓存
+                filter.clear_cache(cache+"\\JPEG")
+                filter.clear_cache(cache+"\\PNG")
+                filter.clear_cache(cache+"\\tmp")
+
+                file.delete_dirs(cache, True)   # 同时删除空目录
+        except control.Cancelled:
+            ok = False
+            print("[service] 任务已取消")
+        except Exception as e:
+            ok = False      # 阶段抛出异常（例如 copy_tree / move_files），保留日志以便续传
+            print(f"[service] 任务异常: {e}")
+            raise
+        finally:
+            journal.close(finished=ok)
+            # 标记任务结束
+            self.stop_processing()
     
 
-    def start_merge(self, src1: str, src2: str, dst: str):
-        """ 合并两个同构的文件夹 """
-        file.merge_dirs(src1, src2, dst)
-
-        # 标记任务结束
-        self.stop_processing()
-
-
-    def start_extract(self, src: str, dst: str, target_dir: str|None):
-        """ 提取文件树中的所有文件，并移动到目标路径下 """
-        file.extract_files(src, dst, target_dir)
-
-        # 标记任务结束
-        self.stop_processing()
+    def start_merge(self, src1: str, src2: str, dst: str, skip_identical: bool = False):
+        """ 合并两个同构的文件夹；skip_identical 时跳过与已有文件内容相同的文件（增量合并） """
+        journal = self._open_journal("merge", {'src1': src1, 'src2': src2, 'dst': dst, 'skip_identical': skip_identical})
+        ok = False
+        try:
+            index_path = os.path.join(dconf.cache, ".index", "merge_index.db")
+            file.merge_dirs(src1, src2, dst, journal, skip_identical=skip_identical, index_path=index_path)
+            ok = True      # 出错时抛出异常，保留日志以便续传
+        except control.Cancelled:
+            print("[service] 任务已取消")
+        finally:
+            journal.close(finished=ok)
+            # 标记任务结束
+            self.stop_processing()
+
+
+    def start_extract(self, src: str, dst: str, target_dir: str|None, move: bool = False):
+        """ 提取文件树中的所有文件到目标路径下；move 时移动文件（删除源文件） """
+        journal = self._open_journal("extract", {'src': src, 'dst': dst, 'target_dir': target_dir, 'move': move})
+        ok = False
+        try:
+            file.extract_files(src, dst, target_dir, journal, move)
+            ok = True
+        except control.Cancelled:
+            print("[service] 任务已取消")
+        finally:
+            journal.close(finished=ok)
+            # 标记任务结束
+            self.stop_processing()
     
 
     def start_delete(self, target: str, only_empty: str):
         """ 删除指定目录下的文件，当 only_empty 为 1 时，只删除空文件夹 """
         oe = True if only_empty == "1" else False
-        file.delete_dirs(target, oe)
-
-        # 标记任务结束
-        self.stop_processing()
\ No newline at end of file
+        try:
+            file.delete_dirs(target, oe)
+        except control.Cancelled:
+            print("[service] 任务已取消")
+        finally:
+            # 标记任务结束
+            self.stop_processing()
\ No newline at end of file